@@ -1,33 +1,41 @@
 import pandas as pd
+from AttendanceSummary import attendance_summary, weekly_attendance
+from CompactFrames import compact_frame
 
 # Update the file path to your specific location
 file_path = ""
 
 # Load the CSV data into a Pandas DataFrame, skip the first row, and infer the column names
+# The raw text is read on purpose, the parsed frames of AnalyticsCore.read_bookings (and its cache) would change
+# every figure below, 'python AnalyticsCLI.py summary' gives the same figures from the cached frame
 df = pd.read_csv(file_path, skiprows=1, header=None)
 
 # Assign meaningful column names based on your data
 df.columns = ['BookingReference', 'Created Date', 'Reference', 'Attendee Status', 'Attended']
 
+# Stores the repeated labels as categoricals to keep large exports small in memory
+compact_frame(df)
+
+# Computes every attendance figure from one pass over 'Attendee Status' and 'Attended'
+summary = attendance_summary(df)
+
 # Basic statistics summary
 print("\nSummary Statistics:")
-print(df.describe())
+print(summary['describe'])
 
 # Count of unique values in 'Attendee Status'
-attendee_status_counts = df['Attendee Status'].value_counts()
 print("\nAttendee Status Counts:")
-print(attendee_status_counts)
+print(summary['status_counts'])
 
-# Count of unique values in 'Attended'
-attended_counts = df['Attended'].value_counts()
-
-# Count of missing values in 'Attended'
-missing_attendance_counts = df['Attended'].isna().sum()
+# Count of unique values in 'Attended' and of missing values in 'Attended'
 print("\nAttended Counts:")
-print(attended_counts)
-print(f"Missing/Empty: There are {missing_attendance_counts} entries with missing or empty values in the Attended column.")
+print(summary['attended_counts'])
+print(f"Missing/Empty: There are {summary['missing_attended']} entries with missing or empty values in the Attended column.")
 
-# Group by 'Attendee Status' and calculate average attendance as a percentage
-avg_attendance_by_status = df.groupby('Attendee Status')['Attended'].apply(lambda x: (x == 'Yes').mean() * 100)
+# Average attendance as a percentage for each 'Attendee Status'
 print("\nAverage Attendance by Attendee Status (in Percentage):")
-print(avg_attendance_by_status)
\ No newline at end of file
+print(summary['attendance_rate_by_status'])
+
+# Attendance for each week, using the same week numbers as FinalAnalytics
+print("\nAttendance by Week:")
+print(weekly_attendance(df).to_string())
\ No newline at end of file
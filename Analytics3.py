@@ -1,22 +1,15 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from AnalyticsCore import read_booking_calendar, interval_counts_from_calendar
 
 # Step 1: Read the data
 file_path = ""
-df = pd.read_csv(file_path, skiprows=1)
-
 # Assuming 'Created Date' is in the second column
-df['Created Date'] = pd.to_datetime(df.iloc[:, 1], format='%d/%m/%Y')
-
-# Calculate the number of weeks between the minimum date and each 'Created Date'
-num_weeks = ((df['Created Date'] - df['Created Date'].min()) / pd.Timedelta(weeks=1)).astype(int) + 1
-
-# Create a new column for the time interval based on the calculated weeks
-df['Time Interval'] = num_weeks
+# The file may also be a weekly aggregate saved by WeeklyAggregate.py, there are no booking rows then
+calendar, df = read_booking_calendar(file_path, date_column=1)
 
-# Group by time interval and count the number of bookings at each interval
-booking_counts = df.groupby('Time Interval').size().reset_index(name='Number of Bookings')
+# Count the number of bookings in each whole week since the first booking
+booking_counts = interval_counts_from_calendar(calendar)
 
 # Plot line graph
 plt.figure(figsize=(10, 6))
@@ -56,4 +49,5 @@ plt.grid(True)
 plt.show()
 
 # Print column names to identify the correct column for advertisement
-print(df.columns)
\ No newline at end of file
+if df is not None:
+    print(df.columns)
\ No newline at end of file
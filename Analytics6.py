@@ -1,22 +1,22 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.ticker as ticker
+from AnalyticsCore import read_booking_calendar, interval_counts_from_calendar
+from ChartRendering import annotate_values, label_indices, text_values
+from TransitionAnalytics import percentage_change
 
 def determine_threshold(booking_counts, percentile=80):
     return np.percentile(booking_counts['Number of Bookings'], percentile)
 
-def plot_booking_activity(file_path):
+def plot_booking_activity(file_path, max_labels=100):
     # Step 1: Read the data
-    df = pd.read_csv(file_path, skiprows=1)
-    df['Created Date'] = pd.to_datetime(df.iloc[:, 1], format='%d/%m/%Y')
-    num_weeks = ((df['Created Date'] - df['Created Date'].min()) / pd.Timedelta(weeks=1)).astype(int) + 1
-    df['Time Interval'] = num_weeks
-    booking_counts = df.groupby('Time Interval').size().reset_index(name='Number of Bookings')
+    # The file may also be a weekly aggregate saved by WeeklyAggregate.py
+    calendar, _ = read_booking_calendar(file_path, date_column=1)
+    booking_counts = interval_counts_from_calendar(calendar)
     threshold = determine_threshold(booking_counts)
 
     # Calculate percentage change for booking counts and limit to 100%
-    booking_counts['Percentage Change'] = booking_counts['Number of Bookings'].pct_change().apply(lambda x: min(x, 1.0)) * 100
+    booking_counts['Percentage Change'] = percentage_change(booking_counts['Number of Bookings'])
 
     plt.figure(figsize=(12, 8))
 
@@ -28,22 +28,24 @@ def plot_booking_activity(file_path):
 
     plt.plot(booking_counts['Time Interval'], booking_counts['Number of Bookings'], linestyle='-', color='black')
 
-    # Annotate the number of bookings at each peak with black background
-    for i, txt in enumerate(booking_counts['Number of Bookings']):
-        plt.annotate(txt, (booking_counts['Time Interval'][i], booking_counts['Number of Bookings'][i]), 
-                     textcoords="offset points", xytext=(0,10), ha='center', 
-                     fontsize=8, color='white', bbox=dict(facecolor='black', edgecolor='none', boxstyle="round"))
+    # Annotate the number of bookings at each peak with black background, thinning the labels on long histories
+    intervals = booking_counts['Time Interval'].to_numpy()
+    counts = booking_counts['Number of Bookings'].to_numpy()
+    annotate_values(plt.gca(), intervals, counts, counts, label_indices(len(counts), max_labels, keep=counts > threshold),
+                    textcoords="offset points", xytext=(0,10), ha='center',
+                    fontsize=8, color='white', bbox=dict(facecolor='black', edgecolor='none', boxstyle="round"))
 
-    # Annotate percentage changes on slopes, color-coded and vertical
-    for i in range(1, len(booking_counts)):
-        pct_change = booking_counts.iloc[i]['Percentage Change']
-        if not np.isnan(pct_change):
-            mid_point_x = (booking_counts.iloc[i]['Time Interval'] + booking_counts.iloc[i-1]['Time Interval']) / 2
-            mid_point_y = (booking_counts.iloc[i]['Number of Bookings'] + booking_counts.iloc[i-1]['Number of Bookings']) / 2
-            color = 'green' if pct_change > 0 else 'red'
-            plt.text(mid_point_x, mid_point_y, f"{pct_change:.2f}%", rotation=90, 
-                     ha='center', va='bottom' if pct_change > 0 else 'top',
-                     fontsize=8, color=color)
+    # Annotate percentage changes on slopes, color-coded and vertical, the change of week i sits between week i-1 and i
+    pct_changes = booking_counts['Percentage Change'].to_numpy()[1:]
+    mid_points_x = (intervals[1:] + intervals[:-1]) / 2
+    mid_points_y = (counts[1:] + counts[:-1]) / 2
+    labels = [f"{pct_change:.2f}%" for pct_change in pct_changes]
+    shown = np.zeros(len(pct_changes), dtype=bool)
+    shown[label_indices(len(pct_changes), max_labels)] = True
+    text_values(plt.gca(), mid_points_x, mid_points_y, labels, np.flatnonzero(shown & (pct_changes > 0)), rotation=90,
+                ha='center', va='bottom', fontsize=8, color='green')
+    text_values(plt.gca(), mid_points_x, mid_points_y, labels, np.flatnonzero(shown & (pct_changes <= 0)), rotation=90,
+                ha='center', va='top', fontsize=8, color='red')
 
     plt.axhline(y=threshold, color='orange', linestyle='--', label=f'Threshold: {threshold}')
 
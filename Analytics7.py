@@ -1,17 +1,17 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.ticker as ticker
+from AnalyticsCore import read_booking_calendar, interval_counts_from_calendar
+from ChartRendering import annotate_values, label_indices
+from TransitionAnalytics import draw_transition_lines, week_transitions
 
 def determine_threshold(booking_counts, percentile=80):
     return np.percentile(booking_counts['Number of Bookings'], percentile)
 
-def plot_booking_activity(file_path):
-    df = pd.read_csv(file_path, skiprows=1)
-    df['Created Date'] = pd.to_datetime(df.iloc[:, 1], format='%d/%m/%Y')
-    num_weeks = ((df['Created Date'] - df['Created Date'].min()) / np.timedelta64(1, 'W')).astype(int)
-    df['Time Interval'] = num_weeks
-    booking_counts = df.groupby('Time Interval').size().reset_index(name='Number of Bookings')
+def plot_booking_activity(file_path, max_labels=100):
+    # The file may also be a weekly aggregate saved by WeeklyAggregate.py
+    calendar, _ = read_booking_calendar(file_path, date_column=1)
+    booking_counts = interval_counts_from_calendar(calendar, first_interval=0)
 
     threshold = determine_threshold(booking_counts)
 
@@ -24,24 +24,28 @@ def plot_booking_activity(file_path):
     # Scatter plot for individual data points
     ax.scatter(booking_counts['Time Interval'], booking_counts['Number of Bookings'], color='white', zorder=5)
 
-    for i in range(1, len(booking_counts)):
-        start = booking_counts.iloc[i - 1]
-        end = booking_counts.iloc[i]
-        pct_change = ((end['Number of Bookings'] - start['Number of Bookings']) / booking_counts['Number of Bookings'].sum()) * 100
-        color = 'green' if pct_change > 0 else 'red'
-        ax.plot([start['Time Interval'], end['Time Interval']], [start['Number of Bookings'], end['Number of Bookings']], color=color, lw=2)
-        
-        # Determine annotation rotation based on the slope of the line
-        rotation = 'vertical' if start['Number of Bookings'] != end['Number of Bookings'] else 'horizontal'
-        mid_point = (start['Time Interval'] + end['Time Interval']) / 2
-        ax.annotate(f"{pct_change:.2f}%", (mid_point, (start['Number of Bookings'] + end['Number of Bookings']) / 2), color='white', 
-                    textcoords="offset points", xytext=(0,10), ha='center', fontsize=8, 
-                    bbox=dict(facecolor=color, alpha=0.5), rotation=rotation)
+    # Change between consecutive weeks as a share of all bookings, the total is computed once for every pair
+    intervals = booking_counts['Time Interval'].to_numpy()
+    counts = booking_counts['Number of Bookings'].to_numpy()
+    transitions = week_transitions(intervals, counts)
+    # Rising segments in green and falling or flat ones in red, all drawn as one collection
+    draw_transition_lines(ax, intervals, counts, lw=2)
 
-    # Annotate each data point with the number of bookings
-    for i, row in booking_counts.iterrows():
-        ax.annotate(row['Number of Bookings'], (row['Time Interval'], row['Number of Bookings']), 
-                    textcoords="offset points", xytext=(0,10), ha='center', color='black', fontsize=8, 
+    # Labels are vertical on sloped segments and horizontal on flat ones, thinned on long histories
+    labels = [f"{pct_change:.2f}%" for pct_change in transitions['Share Change']]
+    rising = (transitions['Share Change'] > 0).to_numpy()
+    flat = (transitions['Delta'] == 0).to_numpy()
+    shown = np.zeros(len(transitions), dtype=bool)
+    shown[label_indices(len(transitions), max_labels)] = True
+    for color, rotation, selected in (('green', 'vertical', rising), ('red', 'vertical', ~rising & ~flat),
+                                      ('red', 'horizontal', flat)):
+        annotate_values(ax, transitions['Mid Interval'], transitions['Mid Bookings'], labels, np.flatnonzero(shown & selected),
+                        color='white', textcoords="offset points", xytext=(0,10), ha='center', fontsize=8,
+                        bbox=dict(facecolor=color, alpha=0.5), rotation=rotation)
+
+    # Annotate the data points with the number of bookings, keeping every point above the threshold
+    annotate_values(ax, intervals, counts, counts, label_indices(len(counts), max_labels, keep=counts > threshold),
+                    textcoords="offset points", xytext=(0,10), ha='center', color='black', fontsize=8,
                     bbox=dict(facecolor='white', edgecolor='none', boxstyle="round,pad=0.3"))
 
     ax.axhline(y=threshold, color='orange', linestyle='--', label='Threshold')
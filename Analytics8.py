@@ -1,8 +1,9 @@
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.ticker as ticker
+from AnalyticsCore import read_booking_calendar, weekly_counts_from_calendar
+from ChartRendering import annotate_values, highlight_scatter, label_indices
 
 def calculate_threshold_mean_std(booking_counts, num_std=1):
     """Calculate a threshold as mean plus a number of standard deviations."""
@@ -11,17 +12,14 @@ def calculate_threshold_mean_std(booking_counts, num_std=1):
     threshold = mean_bookings + num_std * std_bookings
     return threshold
 
-def plot_booking_activity(file_path):
+def plot_booking_activity(file_path, max_labels=100):
     """Plot the booking activity from a CSV file, setting the threshold using mean and standard deviation."""
-    # Read and preprocess data
-    df = pd.read_csv(file_path, skiprows=1)
-    df['Created Date'] = pd.to_datetime(df.iloc[:, 1], format='%d/%m/%Y')
-    start_date = df['Created Date'].min()
-    days_to_monday = (start_date.weekday() - 0) % 7
-    first_monday = start_date - pd.Timedelta(days=days_to_monday)
-    df['Sequential Week Number'] = ((df['Created Date'] - first_monday).dt.days // 7) + 1
-    
-    booking_counts = df.groupby('Sequential Week Number').size().reset_index(name='Number of Bookings')
+    # Read and preprocess data, the file may also be a weekly aggregate saved by WeeklyAggregate.py
+    calendar, _ = read_booking_calendar(file_path, date_column=1)
+
+    # Bookings per sequential week from the first monday, keeping only the weeks with bookings
+    booking_counts, _ = weekly_counts_from_calendar(calendar)
+    booking_counts = booking_counts[booking_counts['Number of Bookings'] > 0].reset_index(drop=True)
     threshold = calculate_threshold_mean_std(booking_counts)
 
     plt.style.use('dark_background')
@@ -34,12 +32,12 @@ def plot_booking_activity(file_path):
     ax.scatter([], [], color='green', label='Above Threshold')
     ax.scatter([], [], color='red', label='Below Threshold')
 
-    # Plot each data point with color based on threshold comparison
-    for i, row in booking_counts.iterrows():
-        color = 'red' if row['Number of Bookings'] < threshold else 'green'
-        ax.scatter(row['Sequential Week Number'], row['Number of Bookings'], color=color, zorder=5)
-        # Annotate the exact number of bookings
-        ax.annotate(row['Number of Bookings'], (row['Sequential Week Number'], row['Number of Bookings']),
+    # Plot all data points in one scatter, coloured by threshold comparison
+    weeks = booking_counts['Sequential Week Number'].to_numpy()
+    counts = booking_counts['Number of Bookings'].to_numpy()
+    highlight_scatter(ax, weeks, counts, counts >= threshold, 'green', 'red', zorder=5)
+    # Annotate the exact number of bookings, thinning the labels on long histories
+    annotate_values(ax, weeks, counts, counts, label_indices(len(counts), max_labels, keep=counts >= threshold),
                     textcoords="offset points", xytext=(0,10), ha='center', color='black', fontsize=8,
                     bbox=dict(facecolor='white', edgecolor='none', boxstyle="round,pad=0.3"))
 
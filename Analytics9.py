@@ -1,50 +1,61 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from functools import partial
 from scipy.stats import zscore
+from AnalyticsCore import read_bookings
+from ChartRendering import highlight_scatter, label_indices, text_values
+from TimeBuckets import bucket_counts, calendar_from_dates
+from WeeklyAggregate import aggregate_calendar, is_aggregate_file, load_aggregate
+from SampledAnalytics import approximate_analysis, progressive_results
 
-def plot_combined_booking_activity_analysis(file_path):
-    # Read data from CSV
-    df = pd.read_csv(file_path)
-    
-    # Strip leading/trailing spaces from column names
-    df.columns = df.columns.str.strip()
-    
-    if 'Created Date' not in df.columns:
-        print("Column 'Created Date' not found. Please check the column names.")
-        return
-    
-    # Convert 'Created Date' to datetime format, specifying dayfirst due to DD/MM/YYYY format
-    df['Created Date'] = pd.to_datetime(df['Created Date'], dayfirst=True)
-    
-    # Sort DataFrame by 'Created Date'
-    df.sort_values(by='Created Date', inplace=True)
-    
-    # Extract sequential week number from 'Created Date'
-    df['Sequential Week Number'] = df['Created Date'].dt.isocalendar().week
-    
-    # Generate a complete sequence of weeks from the minimum to the maximum
-    complete_weeks = range(df['Sequential Week Number'].min(), df['Sequential Week Number'].max() + 1)
-    
-    # Initialize a DataFrame to represent all weeks
-    all_weeks_df = pd.DataFrame(complete_weeks, columns=['Sequential Week Number'])
-    
-    # Count bookings per week
-    booking_counts = df.groupby('Sequential Week Number')['Created Date'].count().reset_index(name='Number of Bookings')
-    
-    # Merge to ensure all weeks are represented, filling missing weeks with 0 bookings
-    booking_counts = all_weeks_df.merge(booking_counts, on='Sequential Week Number', how='left').fillna(0)
+def combined_weekly_counts(file_path):
+    """Return the bookings of every ISO week of a CSV or weekly aggregate, or None when there is no 'Created Date'."""
+    if is_aggregate_file(file_path):
+        # A weekly aggregate saved by WeeklyAggregate.py already holds the bookings per day
+        calendar = aggregate_calendar(load_aggregate(file_path))
+    else:
+        # Only the header is read to check the columns, leading/trailing spaces in their names are ignored
+        if 'Created Date' not in pd.read_csv(file_path, nrows=0).columns.str.strip():
+            print("Column 'Created Date' not found. Please check the column names.")
+            return None
+
+        # These files have no export banner. read_bookings parses each distinct date once, leaves out malformed
+        # dates and reuses the Parquet cache when BOOKING_CACHE_DIR is set
+        df = read_bookings(file_path, banner=False)
+        calendar = calendar_from_dates(df['Created Date'])
     
+    # Count bookings per ISO week, every week from the first to the last booking is included (with 0 bookings
+    # if empty) and the numbering carries on across year ends
+    booking_counts = bucket_counts(calendar, 'isoweek')
+    return booking_counts.rename(columns={'ISO Week': 'Sequential Week Number'})
+
+def draw_combined_booking_activity(booking_counts, max_labels=100, ax=None, threshold_bounds=None):
+    """Draw the combined chart of the weekly counts and return its axes, redrawing ax when one is given.
+
+    Approximate counts (see SampledAnalytics) get error bars, and threshold_bounds is added to the legend.
+    """
     # Calculate Z-scores of booking counts
     booking_counts['z-score'] = zscore(booking_counts['Number of Bookings'].astype(float), ddof=0)
     
     # Map 'Sequential Week Number' to a new sequence starting from 1
     booking_counts['Week Sequence'] = range(1, len(booking_counts) + 1)
 
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(16, 12))
+    if ax is None:
+        plt.style.use('dark_background')
+        fig, ax = plt.subplots(figsize=(16, 12))
+    else:
+        # Removes the approximate chart and keeps its window
+        ax.cla()
 
     # Use 'Week Sequence' for plotting on X-axis
     ax.bar(booking_counts['Week Sequence'], booking_counts['Number of Bookings'], color='grey', alpha=0.5, width=1)
+    approximate = 'Lower Bound' in booking_counts
+    if approximate:
+        # Shows how far each estimated count may be from the exact one
+        ax.errorbar(booking_counts['Week Sequence'], booking_counts['Number of Bookings'],
+                    yerr=[booking_counts['Number of Bookings'] - booking_counts['Lower Bound'],
+                          booking_counts['Upper Bound'] - booking_counts['Number of Bookings']],
+                    fmt='none', ecolor='white', capsize=2)
 
     # Calculations include weeks with 0 bookings
     mean_bookings = booking_counts['Number of Bookings'].mean()
@@ -54,33 +65,62 @@ def plot_combined_booking_activity_analysis(file_path):
     # Calculate offset for text annotation based on range of 'Number of Bookings'
     offset = (max(booking_counts['Number of Bookings']) - min(booking_counts['Number of Bookings'])) * 0.02
 
-    # Annotate each bar with booking count and z-score
-    for i, row in booking_counts.iterrows():
-        color = 'green' if row['Number of Bookings'] > threshold_value else 'red'
-        ax.scatter(row['Week Sequence'], row['Number of Bookings'], color=color, zorder=5)
-        ax.text(row['Week Sequence'], row['Number of Bookings'] + offset, f"{row['Number of Bookings']}", 
-                ha='center', va='bottom', color='white', fontsize=8, 
+    # Plot all points in one scatter, green above the threshold and red otherwise
+    weeks = booking_counts['Week Sequence'].to_numpy()
+    counts = booking_counts['Number of Bookings'].to_numpy(dtype=float)
+    above_threshold = counts > threshold_value
+    highlight_scatter(ax, weeks, counts, above_threshold, 'green', 'red', zorder=5)
+
+    # Annotate the bars with booking count and z-score, thinning the labels on long histories
+    shown = label_indices(len(counts), max_labels, keep=above_threshold)
+    text_values(ax, weeks, counts + offset, [f"{count}" for count in counts], shown,
+                ha='center', va='bottom', color='white', fontsize=8,
                 bbox=dict(facecolor='grey', edgecolor='none', boxstyle="round,pad=0.1"))
-        ax.text(row['Week Sequence'], row['Number of Bookings'] + 2 * offset, f"Z={row['z-score']:.4f}", rotation=90,
-                ha='center', va='bottom', color='white', fontsize=8, 
+    text_values(ax, weeks, counts + 2 * offset, [f"Z={z:.4f}" for z in booking_counts['z-score']], shown, rotation=90,
+                ha='center', va='bottom', color='white', fontsize=8,
                 bbox=dict(facecolor='grey', edgecolor='none', boxstyle="round,pad=0.1"))
 
     # Draw threshold line and update legend
     ax.axhline(y=threshold_value, color='orange', linestyle='--', label=f'Threshold: {threshold_value:.4f}')
 
     legend_text = f'Threshold: {threshold_value:.4f}\nMean: {mean_bookings:.4f}\nSD: {std_bookings:.4f}'
+    if threshold_bounds is not None:
+        legend_text += '\nThreshold range: {:.4f} - {:.4f}'.format(*threshold_bounds)
     ax.legend([legend_text], loc='upper left')
 
     # Configure axis labels and title
     ax.set_xlabel('Sequential Week Number')
     ax.set_ylabel('Number of Bookings')
-    ax.set_title('Combined Booking Activity Analysis')
+    ax.set_title('Combined Booking Activity Analysis' + (' (approximate)' if approximate else ''))
     ax.grid(True, color='gray', linestyle='--', linewidth=0.5)
     ax.set_xticks(booking_counts['Week Sequence'])
     ax.set_xticklabels(booking_counts['Week Sequence'], rotation=45)
     ax.set_ylim(0, max(booking_counts['Number of Bookings']) + (5 * offset))
     
-    plt.tight_layout()
+    ax.figure.tight_layout()
+    return ax
+
+def plot_combined_booking_activity_analysis(file_path, max_labels=100, approximate=False):
+    """Draw the combined chart of a CSV or weekly aggregate.
+
+    With approximate set a chart estimated from a sample of the CSV is shown first while the whole file is read
+    in the background, then the exact chart replaces it in the same window.
+    """
+    ax = None
+    if approximate and not is_aggregate_file(file_path):
+        # The threshold of this chart is the mean plus one standard deviation
+        results = progressive_results(partial(approximate_analysis, file_path, num_std=1),
+                                      partial(combined_weekly_counts, file_path))
+        booking_counts, stats = next(results)
+        ax = draw_combined_booking_activity(booking_counts, max_labels, threshold_bounds=stats['threshold_bounds'])
+        plt.show(block=False)
+        plt.pause(0.001)
+        booking_counts = next(results)
+    else:
+        booking_counts = combined_weekly_counts(file_path)
+    if booking_counts is None:
+        return
+    draw_combined_booking_activity(booking_counts, max_labels, ax=ax)
     plt.show()
 
 
@@ -0,0 +1,231 @@
+"""This script is a single command line entry point for the booking analyses."""
+"""Only the standard library is imported at start up, pandas, numpy, matplotlib and xlsxwriter are imported inside"""
+"""the subcommand that needs them, so --help and the text only subcommands start quickly."""
+"""Subcommands: summary (Analytics1), trend (Analytics2), threshold (FinalAnalytics figures), report (FinalAnalytics)"""
+"""and aggregate (WeeklyAggregate). trend, threshold and report also accept a .weekly.json aggregate instead of a CSV."""
+
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def use_headless_backend():
+    # Charts are only saved to files here, the backend has to be selected before pyplot is imported
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_summary(args):
+    """Print the attendance figures of Analytics1, summary statistics included.
+
+    The bookings are read through AnalyticsCore, so unlike Analytics1 the header line is not counted as a
+    booking and rows without a valid 'Created Date' are left out.
+    """
+    from AnalyticsCore import read_bookings
+    from AttendanceSummary import attendance_summary, weekly_attendance
+    from CompactFrames import describe_as_read
+
+    df = read_bookings(args.file_path)
+    summary = attendance_summary(df)
+    # Analytics1 reads every column as text, so the dates are described as the export's day/month/year labels
+    labels = df.assign(**{'Created Date': df['Created Date'].dt.strftime('%d/%m/%Y')})
+    print("\nSummary Statistics:")
+    print(describe_as_read(labels))
+    print("\nAttendee Status Counts:")
+    print(summary['status_counts'])
+    print("\nAttended Counts:")
+    print(summary['attended_counts'])
+    print(f"Missing/Empty: There are {summary['missing_attended']} entries with missing or empty values "
+          f"in the Attended column.")
+    print("\nAverage Attendance by Attendee Status (in Percentage):")
+    print(summary['attendance_rate_by_status'])
+    if args.weekly:
+        print("\nAttendance by Week:")
+        print(weekly_attendance(df).to_string())
+    return 0
+
+
+def run_trend(args):
+    """Print the linear trend of the bookings per week since the first booking, as Analytics2 draws it."""
+    import numpy as np
+
+    from AnalyticsCore import interval_counts_from_calendar, read_booking_calendar
+
+    calendar, _ = read_booking_calendar(args.file_path, date_column=1)
+    booking_counts = interval_counts_from_calendar(calendar)
+    intervals = booking_counts['Time Interval'].to_numpy()
+    counts = booking_counts['Number of Bookings'].to_numpy()
+    slope, intercept = np.polyfit(intervals, counts, 1)
+    peaks = booking_counts[counts > args.threshold]
+    print(f"Trend: {slope:+.4f} bookings per week (intercept {intercept:.4f}) over {len(booking_counts)} weeks")
+    print(f"Weeks above {args.threshold}: {', '.join(map(str, peaks['Time Interval'])) or 'none'}")
+    if args.chart:
+        use_headless_backend()
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.plot(intervals, np.poly1d((slope, intercept))(intervals), linestyle='--', color='green', label='Linear Curve')
+        ax.scatter(peaks['Time Interval'], peaks['Number of Bookings'], color='black', label='Peaks > Threshold')
+        ax.plot(intervals, counts, marker='o', linestyle='-', color='black')
+        ax.axhline(y=args.threshold, color='orange', linestyle='--', label='Threshold')
+        ax.legend()
+        ax.set_title('Booking Activity Over Time')
+        ax.set_xlabel('Time Interval (weeks)')
+        ax.set_ylabel('Number of Bookings')
+        ax.grid(True)
+        fig.savefig(args.chart)
+        plt.close(fig)
+        print(f"Trend chart saved at: {args.chart}")
+    return 0
+
+
+def run_threshold(args):
+    """Print the FinalAnalytics threshold and the weeks above it, optionally saving the weekly chart."""
+    from AnalyticsCore import analyse_booking_file
+    from WeeklyAggregate import is_aggregate_file
+
+    # An aggregate already holds the exact counts, only a csv file is worth sampling first
+    if args.approximate and not is_aggregate_file(args.file_path):
+        from SampledAnalytics import approximate_analysis, print_approximate_stats
+
+        # A quick estimate from a sample of the file is printed before the exact pass reads all of it
+        print_approximate_stats(approximate_analysis(args.file_path, num_std=args.num_std)[1])
+    booking_counts_complete, stats = analyse_booking_file(args.file_path, num_std=args.num_std,
+                                                          chunksize=args.chunksize, split_workers=args.split_workers)
+    above = booking_counts_complete[booking_counts_complete['Number of Bookings'] > stats['threshold']]
+    print(f"Mean: {stats['mean']:.4f}  SD: {stats['std']:.4f}  Threshold: {stats['threshold']:.4f}")
+    print(f"Week 1 starts on {stats['first_monday']:%d/%m/%Y}, {len(booking_counts_complete)} weeks in total")
+    print("Weeks above the threshold:")
+    print(above.to_string(index=False) if len(above) else "none")
+    if args.chart:
+        use_headless_backend()
+        from FinalAnalytics import draw_weekly_booking_chart
+
+        fig = draw_weekly_booking_chart(booking_counts_complete, stats, os.path.basename(args.file_path))
+        fig.savefig(args.chart, dpi=300, bbox_inches='tight')
+        print(f"Plot image saved at: {args.chart}")
+    return 0
+
+
+def run_report(args):
+    """Save the FinalAnalytics chart and excel report of a file."""
+    use_headless_backend()
+    from FinalAnalytics import plot_booking_activity_analysis_and_display_table
+
+    plot_booking_activity_analysis_and_display_table(args.file_path, show=False, output_directory=args.output_directory,
+                                                    chunksize=args.chunksize, state_dir=args.state_dir,
+                                                    approximate=args.approximate, split_workers=args.split_workers)
+    return 0
+
+
+def run_aggregate(args):
+    """Save the weekly aggregate of every file, which the chart scripts and the other subcommands accept."""
+    from WeeklyAggregate import aggregate_file
+
+    for file_path in args.file_paths:
+        path = aggregate_file(file_path, args.output_directory, num_std=args.num_std, chunksize=args.chunksize)
+        print(f"Weekly aggregate saved at: {path}")
+    return 0
+
+
+def benchmark_startup(commands, repeat=5, env=None):
+    """Return the median wall time in seconds of running every command (a list of arguments) repeat times."""
+    timings = {}
+    for label, command in commands.items():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+            samples.append(time.perf_counter() - started)
+        timings[label] = statistics.median(samples)
+    return timings
+
+
+def run_startup(args):
+    """Compare the start up time of this CLI with importing every analysis module eagerly."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    script = os.path.join(here, 'AnalyticsCLI.py')
+    commands = {
+        'python (empty)': [sys.executable, '-c', 'pass'],
+        'cli --help': [sys.executable, script, '--help'],
+        'cli threshold --help': [sys.executable, script, 'threshold', '--help'],
+        'eager imports': [sys.executable, '-c', 'import matplotlib; matplotlib.use("Agg"); '
+                                                'import FinalAnalytics, AttendanceSummary, numpy, xlsxwriter'],
+    }
+    if args.file_path:
+        commands['cli threshold FILE'] = [sys.executable, script, 'threshold', args.file_path]
+        commands['cli report FILE'] = [sys.executable, script, 'report', args.file_path,
+                                       '--output-directory', args.output_directory]
+    # The eager import command runs outside this folder too, so the analysis modules are put on its path
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+    for label, seconds in benchmark_startup(commands, repeat=args.repeat, env=env).items():
+        print(f"{label:<22} {seconds * 1000:8.1f} ms")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Booking activity analyses from the command line.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    summary = subparsers.add_parser('summary', help="attendance figures (Analytics1)")
+    summary.add_argument('file_path')
+    summary.add_argument('--weekly', action='store_true', help="also print the attendance of every week")
+    summary.set_defaults(handler=run_summary)
+
+    trend = subparsers.add_parser('trend', help="linear trend of the weekly bookings (Analytics2)")
+    trend.add_argument('file_path')
+    trend.add_argument('--threshold', type=float, default=30, help="report the weeks above this many bookings")
+    trend.add_argument('--chart', default=None, help="save the trend chart to this image file")
+    trend.set_defaults(handler=run_trend)
+
+    threshold = subparsers.add_parser('threshold', help="mean + NUM_STD standard deviations threshold (FinalAnalytics)")
+    threshold.add_argument('file_path')
+    threshold.add_argument('--num-std', type=float, default=2)
+    threshold.add_argument('--chunksize', type=int, default=None, help="stream the csv in chunks of this many rows")
+    threshold.add_argument('--chart', default=None, help="save the weekly chart to this image file")
+    threshold.add_argument('--split-workers', type=int, default=None,
+                           help="count the csv in this many processes, each reading its own byte range")
+    threshold.add_argument('--approximate', action='store_true',
+                           help="print figures estimated from a sample of the csv before the exact ones")
+    threshold.set_defaults(handler=run_threshold)
+
+    report = subparsers.add_parser('report', help="chart and excel report (FinalAnalytics)")
+    report.add_argument('file_path')
+    report.add_argument('-o', '--output-directory', default=None,
+                        help="where to create Images/ and reports/ (defaults to next to the csv file)")
+    report.add_argument('--chunksize', type=int, default=None, help="stream the csv in chunks of this many rows")
+    report.add_argument('--state-dir', default=None, help="only read the rows appended since the last run")
+    report.add_argument('--split-workers', type=int, default=None,
+                        help="count the csv in this many processes, each reading its own byte range")
+    report.add_argument('--approximate', action='store_true',
+                        help="save a chart estimated from a sample of the csv first, then replace it with the exact one")
+    report.set_defaults(handler=run_report)
+
+    aggregate = subparsers.add_parser('aggregate', help="save a .weekly.json aggregate that every chart accepts")
+    aggregate.add_argument('file_paths', nargs='+')
+    aggregate.add_argument('-o', '--output-directory', default=None,
+                           help="where to save the aggregates (defaults to next to each csv file)")
+    aggregate.add_argument('--num-std', type=float, default=2)
+    aggregate.add_argument('--chunksize', type=int, default=None, help="stream each csv in chunks of this many rows")
+    aggregate.set_defaults(handler=run_aggregate)
+
+    startup = subparsers.add_parser('startup', help="benchmark the start up time of this CLI")
+    startup.add_argument('file_path', nargs='?', default=None, help="also time threshold and report on this csv")
+    startup.add_argument('--repeat', type=int, default=5)
+    startup.add_argument('-o', '--output-directory', default='startup_benchmark',
+                         help="where the timed report runs write their output")
+    startup.set_defaults(handler=run_startup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
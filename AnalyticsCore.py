@@ -0,0 +1,209 @@
+"""This module holds the weekly booking aggregation shared by the Analytics scripts."""
+"""It only needs pandas, so it can run headless without importing matplotlib or building a figure."""
+
+
+from functools import partial
+
+import pandas as pd
+
+from BookingCache import cached_read, default_cache_dir
+from CompactFrames import CATEGORY_DTYPES, compact_frame, downcast_integers
+from DateParsing import parse_booking_dates, report_malformed_dates
+from Instrumentation import span
+from TimeBuckets import bucket_counts, calendar_from_dates, calendar_from_days, day_numbers, merge_calendars
+from SplitAnalytics import split_calendar
+from WeeklyAggregate import aggregate_calendar, is_aggregate_file, load_aggregate
+
+
+def read_bookings(file_path, date_column='Created Date', cache_dir=None, compact=True, banner=True):
+    """Read a booking CSV (skipping its first row) and parse the booking dates.
+
+    date_column may be a column name or a position, the older scripts assume the date is the second column.
+    When cache_dir is given, or the BOOKING_CACHE_DIR environment variable is set, the parsed frame is
+    cached as Parquet and reused while the CSV is unchanged.
+    With compact set the label columns are categoricals (see CompactFrames).
+    Set banner to False for files without the export banner, whose first row is already the header.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    if cache_dir:
+        variant = str(date_column).replace(' ', '_') + ('-compact' if compact else '')
+        variant += '' if banner else '-nobanner'
+        return cached_read(file_path, partial(parse_bookings, date_column=date_column, compact=compact,
+                                              banner=banner), variant, cache_dir)
+    return parse_bookings(file_path, date_column, compact, banner)
+
+
+def parse_bookings(file_path, date_column='Created Date', compact=True, banner=True):
+    """Parse a booking CSV without using the cache, see read_bookings.
+
+    Rows whose date is missing or malformed are reported and left out.
+    """
+    df = pd.read_csv(file_path, skiprows=1 if banner else 0, dtype=CATEGORY_DTYPES if compact else None)
+    # Some exports pad the column names with spaces
+    df.columns = df.columns.str.strip()
+    if isinstance(date_column, int):
+        values = df.iloc[:, date_column]
+    else:
+        values = df[date_column]
+    # for easier manipulation, Convert the 'Created Date' column to datetime format
+    dates, malformed = parse_booking_dates(values)
+    df['Created Date'] = dates
+    if malformed.any():
+        report_malformed_dates(values, malformed, file_path)
+        df = df[~malformed].reset_index(drop=True)
+    if compact:
+        compact_frame(df)
+    return df
+
+
+def add_sequential_weeks(df, compact=True):
+    """Add a 'Sequential Week Number' column counted from the monday on or before the first booking.
+
+    With compact set the week numbers use the smallest integer type that holds them.
+    Returns the first monday so callers can turn week numbers back into dates.
+    """
+    start_date = df['Created Date'].min()
+    # Calculates the number of days to the first monday from the start date
+    days_to_monday = (start_date.weekday() - 0) % 7
+    # Adjusts the start date to the first monday
+    first_monday = start_date - pd.Timedelta(days=days_to_monday)
+    # Calculates the sequential week numbers for each booking
+    week_numbers = ((df['Created Date'] - first_monday).dt.days // 7) + 1
+    df['Sequential Week Number'] = downcast_integers(week_numbers) if compact else week_numbers
+    return first_monday
+
+
+def weekly_booking_counts(df):
+    """Count bookings per sequential week, including the weeks that had zero bookings.
+
+    Returns the booking_counts_complete frame and the first monday of week 1.
+    """
+    return weekly_counts_from_calendar(calendar_from_dates(df['Created Date']))
+
+
+def weekly_counts_from_calendar(calendar):
+    """Turn a TimeBuckets calendar into booking_counts_complete and the first monday of week 1."""
+    weekly = bucket_counts(calendar, 'weekly')
+    return weekly[['Sequential Week Number', 'Number of Bookings']], weekly['Start Date'].iloc[0]
+
+
+def stream_weekly_counts(file_path, chunksize=1_000_000):
+    """Count bookings per sequential week by reading only 'Created Date', one chunk at a time.
+
+    Each chunk is folded into a running calendar of bookings per day, so memory depends on the number
+    of days covered rather than the file size. The result is identical to weekly_booking_counts(read_bookings(file_path)).
+    """
+    return weekly_counts_from_calendar(stream_calendar(file_path, chunksize=chunksize))
+
+
+def stream_calendar(file_path, chunksize=1_000_000):
+    """Return the TimeBuckets calendar of a booking CSV, reading only 'Created Date' one chunk at a time."""
+    calendar = None
+    malformed_rows = []
+    reader = pd.read_csv(file_path, skiprows=1, usecols=['Created Date'], chunksize=chunksize)
+    for chunk in reader:
+        dates, malformed = parse_booking_dates(chunk['Created Date'])
+        if malformed.any():
+            malformed_rows.append(chunk['Created Date'][malformed])
+        if malformed.all():
+            continue
+        # Folds this chunk into the running count of bookings per day
+        calendar = merge_calendars([calendar, calendar_from_dates(dates)])
+    if malformed_rows:
+        bad_values = pd.concat(malformed_rows)
+        report_malformed_dates(bad_values, pd.Series(True, index=bad_values.index), file_path)
+    if calendar is None:
+        raise ValueError(f"No bookings found in {file_path}")
+    return calendar
+
+
+def read_booking_calendar(file_path, date_column='Created Date', chunksize=None, split_workers=None):
+    """Return (calendar, df) for a booking CSV or a weekly aggregate (see WeeklyAggregate).
+
+    df is the parsed bookings, or None when file_path is an aggregate or the CSV is streamed with chunksize
+    or counted in split_workers processes (see SplitAnalytics).
+    """
+    if is_aggregate_file(file_path):
+        return aggregate_calendar(load_aggregate(file_path)), None
+    if split_workers:
+        return split_calendar(file_path, workers=split_workers, chunksize=chunksize or 1_000_000), None
+    if chunksize:
+        return stream_calendar(file_path, chunksize=chunksize), None
+    df = read_bookings(file_path, date_column=date_column)
+    return calendar_from_dates(df['Created Date']), df
+
+
+def weekly_summary_stats(booking_counts_complete, num_std=2):
+    """Add the 'z-score' column and return the threshold, mean and standard deviation.
+
+    The standard deviation is the population one so that weeks with zero bookings count fully.
+    """
+    # Calculates the mean bookings to establish a threshold for high activity
+    mean_bookings = booking_counts_complete['Number of Bookings'].mean()
+    # Manually calculates the variance and standard deviation to include the weeks which has zero bookings
+    diff_squared = (booking_counts_complete['Number of Bookings'] - mean_bookings) ** 2
+    variance = diff_squared.mean()
+    std_bookings = variance ** 0.5
+    # Defines the threshold as num_std standard deviations above the mean
+    threshold_value = mean_bookings + num_std * std_bookings
+    # Calculates the z-scores for booking counts
+    booking_counts_complete['z-score'] = ((booking_counts_complete['Number of Bookings'] - mean_bookings) / std_bookings).round(4)
+    return {'threshold': threshold_value, 'mean': mean_bookings, 'std': std_bookings}
+
+
+def analyse_booking_file(file_path, num_std=2, chunksize=None, run=None, split_workers=None):
+    """Run the full FinalAnalytics computation for one CSV without plotting anything.
+
+    Pass chunksize to stream very large files instead of loading them whole, and an Instrumentation
+    run to time the read, aggregate and stats stages. file_path may also be a weekly aggregate file.
+    With split_workers the CSV is cut into that many byte ranges counted in parallel processes.
+    Returns (booking_counts_complete, stats) where stats holds threshold, mean, std and first_monday.
+    """
+    if is_aggregate_file(file_path) or split_workers:
+        # Both give the bookings per day directly, reading and counting are timed as the read stage
+        with span(run, 'read'):
+            calendar, _ = read_booking_calendar(file_path, chunksize=chunksize, split_workers=split_workers)
+        return weekly_analysis(*weekly_counts_from_calendar(calendar), num_std=num_std, run=run)
+    if chunksize:
+        # Streaming reads and counts each chunk in one go, so both are timed as the read stage
+        with span(run, 'read'):
+            weekly = stream_weekly_counts(file_path, chunksize=chunksize)
+        return weekly_analysis(*weekly, num_std=num_std, run=run)
+    with span(run, 'read'):
+        df = read_bookings(file_path)
+    return analyse_bookings(df, num_std=num_std, run=run)
+
+
+def analyse_bookings(df, num_std=2, run=None):
+    """Run the FinalAnalytics computation on bookings that are already read, see analyse_booking_file."""
+    with span(run, 'aggregate'):
+        booking_counts_complete, first_monday = weekly_booking_counts(df)
+    return weekly_analysis(booking_counts_complete, first_monday, num_std=num_std, run=run)
+
+
+def weekly_analysis(booking_counts_complete, first_monday, num_std=2, run=None):
+    """Add the z-scores to weekly counts and return them with their stats, see analyse_booking_file."""
+    with span(run, 'stats'):
+        stats = weekly_summary_stats(booking_counts_complete, num_std=num_std)
+    stats['first_monday'] = first_monday
+    return booking_counts_complete, stats
+
+
+def interval_booking_counts(df, first_interval=1):
+    """Count bookings per whole week elapsed since the first booking, as Analytics2-7 do.
+
+    Only intervals that contain bookings are returned, numbered from first_interval.
+    """
+    days = day_numbers(df['Created Date'])
+    # Calculate the number of weeks between the minimum date and each 'Created Date'
+    df['Time Interval'] = downcast_integers((days - days.min()) // 7 + first_interval)
+    return interval_counts_from_calendar(calendar_from_days(days), first_interval)
+
+
+def interval_counts_from_calendar(calendar, first_interval=1):
+    """Count bookings per whole week since the first booking from a calendar, see interval_booking_counts."""
+    # Count the bookings of every interval from the calendar, keeping only the intervals with bookings
+    intervals = bucket_counts(calendar, 'interval')
+    intervals['Time Interval'] += first_interval - 1
+    intervals = intervals[intervals['Number of Bookings'] > 0]
+    return intervals[['Time Interval', 'Number of Bookings']].reset_index(drop=True)
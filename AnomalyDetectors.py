@@ -0,0 +1,245 @@
+"""This module flags unusual booking weeks one week at a time, as the bookings arrive."""
+"""Every detector keeps a small running state and is updated with each new weekly count in constant time,"""
+"""instead of recomputing a global mean + 2*std, percentile or z-score over the whole history."""
+
+
+import argparse
+import bisect
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from AnalyticsCore import analyse_booking_file
+
+
+def _spread_score(value, centre, spread):
+    """Return (value - centre) / spread, or an infinite score of the right sign when the history has no spread.
+
+    After weeks that were all the same any different week is infinitely unusual, so a spike is still flagged.
+    """
+    if spread:
+        return (value - centre) / spread
+    return math.copysign(math.inf, value - centre) if value != centre else 0.0
+
+
+class GlobalZScoreDetector:
+    """Mean + num_std * std over every week seen so far, as FinalAnalytics does, kept with Welford's update."""
+
+    def __init__(self, num_std=2, min_periods=4):
+        self.num_std = num_std
+        self.min_periods = min_periods
+        self.count = 0
+        self.mean = 0.0
+        self.sum_squared_diffs = 0.0
+
+    def threshold(self):
+        if self.count < self.min_periods:
+            return math.nan
+        return self.mean + self.num_std * math.sqrt(self.sum_squared_diffs / self.count)
+
+    def score(self, value):
+        if self.count < self.min_periods:
+            return math.nan
+        return _spread_score(value, self.mean, math.sqrt(self.sum_squared_diffs / self.count))
+
+    def learn(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.sum_squared_diffs += delta * (value - self.mean)
+
+    def update(self, value):
+        """Score value against the weeks before it, then add it to the history. Returns (score, is_anomaly)."""
+        score = self.score(value)
+        is_anomaly = bool(score > self.num_std)
+        self.learn(value)
+        return score, is_anomaly
+
+
+class RollingZScoreDetector(GlobalZScoreDetector):
+    """Z-score against the last window weeks only, kept as a running sum and sum of squares."""
+
+    def __init__(self, window=8, num_std=2, min_periods=4):
+        super().__init__(num_std=num_std, min_periods=min_periods)
+        self.window = deque(maxlen=window)
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def _moments(self):
+        mean = self.total / len(self.window)
+        return mean, math.sqrt(max(self.total_squares / len(self.window) - mean * mean, 0.0))
+
+    def threshold(self):
+        if len(self.window) < self.min_periods:
+            return math.nan
+        mean, std = self._moments()
+        return mean + self.num_std * std
+
+    def score(self, value):
+        if len(self.window) < self.min_periods:
+            return math.nan
+        mean, std = self._moments()
+        return _spread_score(value, mean, std)
+
+    def learn(self, value):
+        if len(self.window) == self.window.maxlen:
+            oldest = self.window[0]
+            self.total -= oldest
+            self.total_squares -= oldest * oldest
+        self.window.append(value)
+        self.total += value
+        self.total_squares += value * value
+
+
+class EWMADetector(GlobalZScoreDetector):
+    """Exponentially weighted mean and variance, recent weeks count more. alpha is the weight of the newest week."""
+
+    def __init__(self, alpha=0.3, num_std=2, min_periods=4):
+        super().__init__(num_std=num_std, min_periods=min_periods)
+        self.alpha = alpha
+        self.variance = 0.0
+
+    def threshold(self):
+        if self.count < self.min_periods:
+            return math.nan
+        return self.mean + self.num_std * math.sqrt(self.variance)
+
+    def score(self, value):
+        if self.count < self.min_periods:
+            return math.nan
+        return _spread_score(value, self.mean, math.sqrt(self.variance))
+
+    def learn(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = float(value)
+            return
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+
+
+class _SortedWindow:
+    """The last size values kept both in arrival order and sorted, for medians and percentiles."""
+
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.ordered = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        if len(self.values) == self.values.maxlen:
+            del self.ordered[bisect.bisect_left(self.ordered, self.values[0])]
+        self.values.append(value)
+        bisect.insort(self.ordered, value)
+
+    def quantile(self, q):
+        return float(np.quantile(self.ordered, q))
+
+
+class MADDetector(GlobalZScoreDetector):
+    """Robust modified z-score 0.6745 * (x - median) / MAD over the last window weeks.
+
+    The window is kept sorted, so an update costs O(window) at most, independent of how long the
+    history is. A score above num_std (3.5 by convention) is an anomaly.
+    """
+
+    def __init__(self, window=12, num_std=3.5, min_periods=4):
+        super().__init__(num_std=num_std, min_periods=min_periods)
+        self.window = _SortedWindow(window)
+
+    def _median_and_mad(self):
+        median = self.window.quantile(0.5)
+        mad = float(np.median(np.abs(np.asarray(self.window.ordered) - median)))
+        return median, mad
+
+    def threshold(self):
+        if len(self.window) < self.min_periods:
+            return math.nan
+        median, mad = self._median_and_mad()
+        return median + self.num_std * mad / 0.6745
+
+    def score(self, value):
+        if len(self.window) < self.min_periods:
+            return math.nan
+        median, mad = self._median_and_mad()
+        return _spread_score(value, median, mad / 0.6745)
+
+    def learn(self, value):
+        self.window.add(value)
+
+
+class RollingPercentileDetector(MADDetector):
+    """Flags weeks above the given percentile of the last window weeks, as Analytics6/7 do over the whole history."""
+
+    def __init__(self, window=12, percentile=80, min_periods=4):
+        super().__init__(window=window, num_std=0, min_periods=min_periods)
+        self.percentile = percentile
+
+    def threshold(self):
+        if len(self.window) < self.min_periods:
+            return math.nan
+        return self.window.quantile(self.percentile / 100)
+
+    def score(self, value):
+        # The score is how far above (positive) or below the percentile threshold the week is
+        return value - self.threshold()
+
+    def update(self, value):
+        score = self.score(value)
+        is_anomaly = bool(score > 0)
+        self.learn(value)
+        return score, is_anomaly
+
+
+DETECTORS = {
+    'global': GlobalZScoreDetector,
+    'rolling': RollingZScoreDetector,
+    'ewma': EWMADetector,
+    'mad': MADDetector,
+    'percentile': RollingPercentileDetector,
+}
+
+
+def make_detector(method, **options):
+    """Create a detector by name: global, rolling, ewma, mad or percentile."""
+    if method not in DETECTORS:
+        raise ValueError(f"Unknown detector '{method}', choose one of: {', '.join(DETECTORS)}")
+    return DETECTORS[method](**options)
+
+
+def detect(detector, counts):
+    """Feed weekly counts through a detector in order and return the threshold, score and flag of every week."""
+    rows = []
+    for value in counts:
+        threshold = detector.threshold()
+        score, is_anomaly = detector.update(float(value))
+        rows.append((float(value), threshold, score, is_anomaly))
+    return pd.DataFrame(rows, columns=['Number of Bookings', 'threshold', 'score', 'anomaly'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag unusual booking weeks with a streaming detector.")
+    parser.add_argument('file_path')
+    parser.add_argument('--method', choices=sorted(DETECTORS), default='rolling')
+    parser.add_argument('--window', type=int, default=None, help="weeks of history for rolling, mad and percentile")
+    parser.add_argument('--alpha', type=float, default=None, help="weight of the newest week for ewma")
+    args = parser.parse_args(argv)
+    options = {}
+    if args.window is not None:
+        options['window'] = args.window
+    if args.alpha is not None:
+        options['alpha'] = args.alpha
+    booking_counts_complete, _ = analyse_booking_file(args.file_path)
+    flags = detect(make_detector(args.method, **options), booking_counts_complete['Number of Bookings'])
+    flags.insert(0, 'Sequential Week Number', booking_counts_complete['Sequential Week Number'])
+    print(flags[flags['anomaly']].to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+"""This module computes the attendance statistics printed by Analytics1.py."""
+"""'Attendee Status' and 'Attended' are turned into categoricals and counted together in one pass, and every figure"""
+"""(status counts, attended counts, missing values and attendance rate per status) is read off that one table."""
+
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from AnalyticsCore import add_sequential_weeks, read_bookings
+from CompactFrames import describe_as_read, value_counts_order
+from DateParsing import parse_booking_dates, report_malformed_dates
+
+STATUS_COLUMN = 'Attendee Status'
+ATTENDED_COLUMN = 'Attended'
+MISSING = 'Missing'
+
+
+def to_attendance_categoricals(df):
+    """Convert 'Attendee Status' and 'Attended' to categoricals in place, they only hold a few repeated labels."""
+    for column in (STATUS_COLUMN, ATTENDED_COLUMN):
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def attendance_table(df):
+    """Count the bookings of every (Attendee Status, Attended) pair, with a 'Missing' row and column for empty values.
+
+    The two categorical codes are combined into one integer so the whole frame is counted with a single bincount.
+    """
+    to_attendance_categoricals(df)
+    status = df[STATUS_COLUMN].cat
+    attended = df[ATTENDED_COLUMN].cat
+    status_count = len(status.categories) + 1
+    attended_count = len(attended.categories) + 1
+    # Code -1 marks a missing value, shifting by one puts it in the first row/column of the table
+    keys = (status.codes.to_numpy(dtype=np.int64) + 1) * attended_count + attended.codes.to_numpy(dtype=np.int64) + 1
+    counts = np.bincount(keys, minlength=status_count * attended_count).reshape(status_count, attended_count)
+    return pd.DataFrame(counts, index=pd.Index([MISSING] + list(status.categories), name=STATUS_COLUMN),
+                        columns=pd.Index([MISSING] + list(attended.categories), name=ATTENDED_COLUMN))
+
+
+def attendance_summary(df):
+    """Return every Analytics1 figure computed from one attendance_table pass.
+
+    The result holds the summary statistics, the Attendee Status and Attended counts, the number of
+    missing Attended values and the attendance percentage (share of 'Yes') per Attendee Status.
+    """
+    table = attendance_table(df)
+    known = table.drop(index=MISSING)
+    status_counts = known.sum(axis=1)
+    attended_counts = table.drop(columns=MISSING).sum(axis=0)
+    yes = known['Yes'] if 'Yes' in known.columns else pd.Series(0, index=known.index)
+    return {
+        'describe': describe_as_read(df),
+        'status_counts': value_counts_order(status_counts, df[STATUS_COLUMN]),
+        'attended_counts': value_counts_order(attended_counts, df[ATTENDED_COLUMN]),
+        'missing_attended': int(table[MISSING].sum()),
+        # Same as groupby('Attendee Status')['Attended'].apply(lambda x: (x == 'Yes').mean() * 100)
+        'attendance_rate_by_status': (yes / status_counts * 100)[status_counts > 0].rename(ATTENDED_COLUMN),
+        'table': table,
+    }
+
+
+def attendance_breakdown(df, keys):
+    """Return bookings, attended bookings and attendance rate per group, for example per week or per file.
+
+    keys are the grouping columns such as ['Sequential Week Number'] or ['Source File', 'Sequential Week Number'];
+    the booking count of every Attendee Status is added as one column each.
+    """
+    to_attendance_categoricals(df)
+    attended_yes = (df[ATTENDED_COLUMN] == 'Yes').rename('attended')
+    grouped = attended_yes.groupby([df[key] for key in keys], observed=True)
+    breakdown = pd.DataFrame({'bookings': grouped.size(), 'attended': grouped.sum()})
+    breakdown['attendance rate'] = breakdown['attended'] / breakdown['bookings'] * 100
+    by_status = df.groupby(keys + [STATUS_COLUMN], observed=True).size().unstack(STATUS_COLUMN, fill_value=0)
+    return breakdown.join(by_status)
+
+
+def weekly_attendance(df):
+    """Attendance breakdown per sequential week, using the same weeks as FinalAnalytics."""
+    if not pd.api.types.is_datetime64_any_dtype(df['Created Date']):
+        # Analytics1 reads the export with header=None, its header line is not a booking with a malformed date
+        df = df[df['Created Date'].astype(str).str.strip() != 'Created Date']
+        raw_dates = df['Created Date']
+        dates, malformed = parse_booking_dates(raw_dates)
+        report_malformed_dates(raw_dates, malformed, 'the attendance data')
+        df = df.assign(**{'Created Date': dates})[~malformed.to_numpy()].copy()
+    add_sequential_weeks(df)
+    return attendance_breakdown(df, ['Sequential Week Number'])
+
+
+def attendance_by_file(file_paths):
+    """Attendance breakdown per booking file, reading every file through AnalyticsCore.
+
+    Files are keyed by their full path, so files with the same name in different folders stay apart.
+    """
+    frames = []
+    for file_path in file_paths:
+        df = read_bookings(file_path)[[STATUS_COLUMN, ATTENDED_COLUMN]]
+        frames.append(df.assign(**{'Source File': os.path.abspath(file_path)}))
+    combined = pd.concat(frames, ignore_index=True)
+    combined['Source File'] = combined['Source File'].astype('category')
+    return attendance_breakdown(combined, ['Source File'])
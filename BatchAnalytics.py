@@ -0,0 +1,264 @@
+"""This script runs the FinalAnalytics booking analysis over a whole folder of csv files."""
+"""Files are spread across a pool of worker processes, and one bad csv file does not stop the rest."""
+"""Every chart is saved into an Images folder and every report into a reports folder, exactly like FinalAnalytics."""
+
+
+import argparse
+import glob
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Instrumentation import append_json_line, finish_run, merge_run, new_run, span, span_percentiles, write_chrome_trace
+
+
+def find_booking_files(source):
+    """Return the sorted csv files in a directory, or the files matching a glob pattern."""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "*.csv")
+    else:
+        pattern = source
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def source_labels(file_paths):
+    """Return a unique label for every file: its file name, or its path below the folder all files share when
+    two files in different folders have the same name."""
+    names = [os.path.basename(file_path) for file_path in file_paths]
+    if len(set(names)) == len(names):
+        return names
+    return _paths_below_common_folder(file_paths)
+
+
+def _paths_below_common_folder(file_paths):
+    paths = [os.path.abspath(file_path) for file_path in file_paths]
+    common = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.relpath(path, common) for path in paths]
+
+
+def output_directories(file_paths, output_directory=None):
+    """Return the folder every file's Images and reports folders are created in, keyed by file path.
+
+    Without output_directory the outputs stay next to each csv file. With it, the input subfolders are mirrored
+    below output_directory when two files have the same name, so neither overwrites the other's chart and report.
+    """
+    from WeeklyAggregate import source_name
+
+    if output_directory is None:
+        return dict.fromkeys(file_paths)
+    names = [source_name(file_path) for file_path in file_paths]
+    if len(set(names)) == len(names):
+        return dict.fromkeys(file_paths, output_directory)
+    return {file_path: os.path.normpath(os.path.join(output_directory, os.path.dirname(relative)))
+            for file_path, relative in zip(file_paths, _paths_below_common_folder(file_paths))}
+
+
+def output_collisions(directories):
+    """Return a failed result for every file whose chart and report paths another file would also write.
+
+    directories is the output_directories mapping, such files are left out of the batch instead of
+    silently overwriting each other (for example 'a.csv' and 'a.weekly.json' in one folder).
+    """
+    from WeeklyAggregate import source_name
+
+    keys = {file_path: (os.path.normcase(os.path.abspath(directory if directory is not None
+                                                         else os.path.dirname(file_path))),
+                        os.path.normcase(source_name(file_path)))
+            for file_path, directory in directories.items()}
+    counts = Counter(keys.values())
+    failures = {}
+    for file_path, key in keys.items():
+        if counts[key] > 1:
+            others = [other for other, other_key in keys.items() if other_key == key and other != file_path]
+            failures[file_path] = {"file": file_path, "ok": False, "seconds": 0.0,
+                                   "error": f"ValueError: the outputs would overwrite those of {', '.join(others)}"}
+    return failures
+
+
+def analyse_one_file(file_path, output_directory=None, chunksize=None, instrument=False, trace_memory=False,
+                     render=True, return_counts=False):
+    """Worker entry point: run the FinalAnalytics report for one csv file and record the outcome.
+
+    With instrument set, the result carries the per stage timings under "metrics". With render set to False
+    only the excel report is written and the chart data is returned under "chart" for a RenderService.
+    With return_counts set the weekly counts and stats are returned under "counts" and "stats" for a CountStore.
+    """
+    # The non interactive backend has to be selected before pyplot is imported by FinalAnalytics
+    import matplotlib
+    matplotlib.use("Agg")
+    from AnalyticsCore import analyse_booking_file
+    from FinalAnalytics import plot_booking_activity_analysis_and_display_table, report_paths
+    from ReportWriter import write_weekly_report
+
+    run = new_run(os.path.basename(file_path), trace_memory=trace_memory) if instrument else None
+    analysed = {}
+
+    def keep_counts(booking_counts_complete, stats):
+        if return_counts:
+            analysed.update(counts=booking_counts_complete["Number of Bookings"].to_numpy(), stats=stats)
+
+    started = time.perf_counter()
+    try:
+        if render:
+            image_file_path, excel_filepath = plot_booking_activity_analysis_and_display_table(
+                file_path, show=False, output_directory=output_directory, chunksize=chunksize, run=run,
+                on_analysed=keep_counts)
+            result = {"file": file_path, "ok": True, "image": image_file_path, "report": excel_filepath}
+        else:
+            booking_counts_complete, stats = analyse_booking_file(file_path, chunksize=chunksize, run=run)
+            keep_counts(booking_counts_complete, stats)
+            image_file_path, excel_filepath = report_paths(file_path, output_directory)
+            with span(run, "xlsx"):
+                write_weekly_report(excel_filepath, booking_counts_complete, stats)
+            result = {"file": file_path, "ok": True, "report": excel_filepath,
+                      "chart": (booking_counts_complete, stats, os.path.basename(file_path), image_file_path)}
+        result.update(analysed)
+    except Exception as error:
+        result = {"file": file_path, "ok": False, "error": f"{type(error).__name__}: {error}"}
+    result["seconds"] = time.perf_counter() - started
+    if run is not None:
+        result["metrics"] = finish_run(run)
+    return result
+
+
+def run_batch(source, workers=None, output_directory=None, chunksize=None, instrument=False, trace_memory=False,
+              render_workers=None, store_dir=None):
+    """Analyse every booking csv found in source using a pool of worker processes.
+
+    With render_workers the charts are drawn by a separate RenderService pool of that many processes,
+    so charts are rendered while the other workers are still reading files and writing reports.
+    With store_dir the weekly counts of every file are added to the CountStore in that directory.
+    Returns one result dictionary per file, in the order the files were found.
+    """
+    file_paths = find_booking_files(source)
+    if not file_paths:
+        print(f"No csv files found for: {source}")
+        return []
+    directories = output_directories(file_paths, output_directory)
+    # Files that would overwrite each other's outputs are failed before any work is dispatched
+    results = output_collisions(directories)
+    remaining = [path for path in file_paths if path not in results]
+    if render_workers:
+        results.update(_run_batch_with_render_service(remaining, workers, directories, chunksize, instrument,
+                                                      trace_memory, render_workers, bool(store_dir)))
+    else:
+        results.update(_run_batch(remaining, workers, directories, chunksize, instrument, trace_memory,
+                                  bool(store_dir)))
+    results = [results[path] for path in file_paths]
+    if store_dir:
+        # Only this process writes to the store, so parallel workers never race on its files
+        from CountStore import store_results
+        store_results(store_dir, results)
+        for result in results:
+            result.pop("counts", None)
+            result.pop("stats", None)
+    return results
+
+
+def _run_batch(file_paths, workers, directories, chunksize, instrument, trace_memory, return_counts):
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(analyse_one_file, path, directories[path], chunksize,
+                                   instrument, trace_memory, True, return_counts): path for path in file_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as error:
+                # A worker that died (for example killed by the OS) is reported like any other failure
+                results[path] = {"file": path, "ok": False, "error": f"{type(error).__name__}: {error}",
+                                 "seconds": 0.0}
+    return results
+
+
+def _run_batch_with_render_service(file_paths, workers, directories, chunksize, instrument, trace_memory,
+                                   render_workers, return_counts):
+    from RenderService import RenderService
+
+    results = {}
+    charts = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor, RenderService(render_workers) as renderer:
+        futures = {executor.submit(analyse_one_file, path, directories[path], chunksize, instrument, trace_memory,
+                                   False, return_counts): path for path in file_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as error:
+                results[path] = {"file": path, "ok": False, "error": f"{type(error).__name__}: {error}",
+                                 "seconds": 0.0}
+                continue
+            if results[path]["ok"]:
+                # Queues the chart as soon as its report is written, while other files are still being read
+                charts[path] = renderer.submit(*results[path].pop("chart"), instrument=instrument)
+        for path, chart in charts.items():
+            result = results[path]
+            try:
+                result["image"], record = chart.result()
+            except Exception as error:
+                result.update(ok=False, error=f"{type(error).__name__}: {error}")
+                continue
+            if record is not None and "metrics" in result:
+                merge_run(result["metrics"], record)
+    return results
+
+
+def print_batch_summary(results):
+    """Print a per file success/failure table followed by the totals."""
+    for result, name in zip(results, source_labels([result["file"] for result in results])):
+        if result["ok"]:
+            print(f"OK     {name} ({result['seconds']:.2f}s)")
+        else:
+            print(f"FAILED {name}: {result['error']}")
+    failed = sum(1 for result in results if not result["ok"])
+    print(f"\n{len(results) - failed} succeeded, {failed} failed, {len(results)} files in total.")
+
+
+def print_stage_percentiles(results):
+    """Print the p50/p90/p99 wall time of every stage across the files that were analysed successfully."""
+    records = [result["metrics"] for result in results if result["ok"] and "metrics" in result]
+    if not records:
+        return
+    print("\nStage timings across files (seconds):")
+    for name, values in span_percentiles(records).items():
+        print(f"{name:<10} " + "  ".join(f"{label} {value:.3f}" for label, value in values.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the booking activity analysis over many csv files.")
+    parser.add_argument("source", help="a directory of csv files or a glob pattern such as 'Data Files/*.csv'")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes (defaults to the number of CPUs)")
+    parser.add_argument("-o", "--output-directory", default=None,
+                        help="where to create Images/ and reports/ (defaults to next to each csv file)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream each csv in chunks of this many rows to keep memory flat on very large files")
+    parser.add_argument("--metrics", default=None,
+                        help="append the per stage timings of every file to this JSON lines file")
+    parser.add_argument("--trace", default=None, help="save the stage timings as a Chrome trace file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record the tracemalloc peak of every stage (slower)")
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="draw the charts in a separate pool of this many processes that reuse their figure")
+    parser.add_argument("--store", default=None,
+                        help="add the weekly counts of every file to the count store in this directory")
+    args = parser.parse_args(argv)
+    instrument = bool(args.metrics or args.trace or args.trace_memory)
+    results = run_batch(args.source, workers=args.workers, output_directory=args.output_directory,
+                        chunksize=args.chunksize, instrument=instrument, trace_memory=args.trace_memory,
+                        render_workers=args.render_workers, store_dir=args.store)
+    print_batch_summary(results)
+    print_stage_percentiles(results)
+    records = [result["metrics"] for result in results if "metrics" in result]
+    if args.metrics:
+        for record in records:
+            append_json_line(record, args.metrics)
+    if args.trace:
+        write_chrome_trace(records, args.trace)
+    # A non zero exit code lets scheduled jobs notice that some files failed
+    return 1 if any(not result["ok"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
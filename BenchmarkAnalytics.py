@@ -0,0 +1,158 @@
+"""This script benchmarks the booking analysis pipeline on synthetic booking data."""
+"""It generates booking CSVs in the five column export format, times every FinalAnalytics stage separately"""
+"""and stores the results as JSON so that runs of different versions can be compared for regressions."""
+
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+BOOKING_COLUMNS = ['BookingReference', 'Created Date', 'Reference', 'Attendee Status', 'Attended']
+
+STAGES = ['read', 'date_parse', 'week_bucketing', 'stats', 'render', 'savefig', 'xlsx']
+
+
+def generate_booking_csv(file_path, rows, start_date='2022-01-03', days=730, seed=0, chunk_rows=1_000_000):
+    """Write a synthetic booking export with the given number of rows and return its path.
+
+    The file has the export banner line, the header and the five columns Analytics1.py expects.
+    Bookings are spread over the given number of days with a few busy weeks, and written in chunks
+    so even 50M row files can be generated without holding them in memory.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(start_date, 'D')
+    # A few promotional peaks on top of a flat background make the threshold and z-scores meaningful
+    day_weights = np.ones(days)
+    for peak in rng.integers(0, days, size=max(days // 90, 1)):
+        day_weights[peak:peak + 7] += 8
+    day_weights /= day_weights.sum()
+    with open(file_path, 'w', newline='') as handle:
+        handle.write('Synthetic booking export\n')
+        handle.write(','.join(BOOKING_COLUMNS) + '\n')
+        for first_row in range(0, rows, chunk_rows):
+            size = min(chunk_rows, rows - first_row)
+            dates = start + rng.choice(days, size=size, p=day_weights).astype('timedelta64[D]')
+            chunk = pd.DataFrame({
+                'BookingReference': np.char.add('BK', np.arange(first_row, first_row + size).astype(str)),
+                'Created Date': pd.to_datetime(dates).strftime('%d/%m/%Y'),
+                'Reference': rng.choice(['Website', 'Email', 'Social Media', 'Partner'], size=size),
+                'Attendee Status': rng.choice(['Booked', 'Cancelled', 'Waiting List'], size=size, p=[0.8, 0.15, 0.05]),
+                'Attended': rng.choice(np.array(['Yes', 'No', ''], dtype=object), size=size, p=[0.6, 0.3, 0.1]),
+            })
+            chunk.to_csv(handle, header=False, index=False)
+    return file_path
+
+
+def _timed(timings, stage, function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[stage] = time.perf_counter() - started
+    return result
+
+
+def benchmark_file(file_path, output_directory):
+    """Run every FinalAnalytics stage on one CSV and return the seconds spent in each of them."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from AnalyticsCore import weekly_booking_counts, weekly_summary_stats
+    from FinalAnalytics import draw_weekly_booking_chart
+    from ReportWriter import write_weekly_report
+
+    timings = {}
+    df = _timed(timings, 'read', pd.read_csv, file_path, skiprows=1)
+    df['Created Date'] = _timed(timings, 'date_parse', pd.to_datetime, df['Created Date'], format='%d/%m/%Y')
+    booking_counts_complete, first_monday = _timed(timings, 'week_bucketing', weekly_booking_counts, df)
+    stats = _timed(timings, 'stats', weekly_summary_stats, booking_counts_complete)
+    fig = _timed(timings, 'render', draw_weekly_booking_chart, booking_counts_complete, stats,
+                 os.path.basename(file_path))
+    os.makedirs(output_directory, exist_ok=True)
+    _timed(timings, 'savefig', fig.savefig, os.path.join(output_directory, 'benchmark.png'), dpi=300,
+           bbox_inches='tight')
+    plt.close(fig)
+    _timed(timings, 'xlsx', write_weekly_report, os.path.join(output_directory, 'benchmark.xlsx'),
+           booking_counts_complete, stats)
+    timings['total'] = sum(timings[stage] for stage in STAGES)
+    return timings
+
+
+def code_version():
+    """Return the current git commit of the repository, or 'unknown' outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmarks(row_counts, work_directory, repeat=1):
+    """Generate one synthetic file per row count, benchmark it and return the results document.
+
+    With repeat > 1 the fastest time of each stage is kept, which is the least noisy estimate.
+    """
+    os.makedirs(work_directory, exist_ok=True)
+    results = {'version': code_version(), 'python': platform.python_version(), 'pandas': pd.__version__,
+               'machine': platform.machine(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'runs': []}
+    for rows in row_counts:
+        file_path = os.path.join(work_directory, f'synthetic_{rows}.csv')
+        if not os.path.exists(file_path):
+            generate_booking_csv(file_path, rows)
+        best = {}
+        for _ in range(repeat):
+            timings = benchmark_file(file_path, os.path.join(work_directory, 'output'))
+            best = {stage: min(seconds, best.get(stage, seconds)) for stage, seconds in timings.items()}
+        results['runs'].append({'rows': rows, 'seconds': best})
+        print(f"{rows:>12,} rows: " + ', '.join(f"{stage} {best[stage]:.3f}s" for stage in STAGES + ['total']))
+    return results
+
+
+def compare_results(baseline, current, tolerance=0.2, min_seconds=0.05):
+    """Return a message for every stage that got more than tolerance (20%) slower than in the baseline.
+
+    Differences below min_seconds are ignored, they are timer noise on the small stages.
+    """
+    baseline_runs = {run['rows']: run['seconds'] for run in baseline['runs']}
+    regressions = []
+    for run in current['runs']:
+        previous = baseline_runs.get(run['rows'])
+        if previous is None:
+            continue
+        for stage in STAGES + ['total']:
+            before, after = previous.get(stage), run['seconds'].get(stage)
+            if before and after and after > before * (1 + tolerance) and after - before > min_seconds:
+                regressions.append(f"{run['rows']:,} rows, {stage}: {before:.3f}s -> {after:.3f}s "
+                                   f"(+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the booking analysis pipeline on synthetic data.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="row counts to benchmark, for example 10000 1000000 50000000")
+    parser.add_argument('--work-directory', default='benchmark_data',
+                        help="where the synthetic CSV files and outputs are kept between runs")
+    parser.add_argument('--repeat', type=int, default=1, help="run each size this many times and keep the best")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file to write the results to")
+    parser.add_argument('--compare', default=None, help="a previous results file to check for regressions")
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.rows, args.work_directory, repeat=args.repeat)
+    with open(args.output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"Results saved at: {args.output}")
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare_results(json.load(handle), results)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,131 @@
+"""This module keeps an on-disk Parquet cache of parsed booking CSV files."""
+"""A cached file is reused while the CSV keeps the same path, size and modification time, or the same content hash,"""
+"""so repeat runs over unchanged exports skip CSV parsing and date conversion entirely."""
+
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+
+import pandas as pd
+
+# Setting this environment variable turns the cache on for every script that reads bookings through AnalyticsCore
+CACHE_DIR_VARIABLE = 'BOOKING_CACHE_DIR'
+DEFAULT_CACHE_DIR = '.booking_cache'
+
+
+def default_cache_dir():
+    """Return the cache directory named by BOOKING_CACHE_DIR, or None when caching is switched off."""
+    return os.environ.get(CACHE_DIR_VARIABLE) or None
+
+
+def parquet_available():
+    """Return True when pandas has a Parquet engine (pyarrow or fastparquet) to read and write the cache."""
+    return any(importlib.util.find_spec(engine) is not None for engine in ('pyarrow', 'fastparquet'))
+
+
+def file_content_hash(file_path, block_size=1 << 20):
+    """Return the sha256 hex digest of a file, read in blocks so large files are not loaded whole."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_entry_path(cache_dir, file_path):
+    # One small json file per source, named after its absolute path, so parallel workers never share an index file
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f'source-{key}.json')
+
+
+def _data_path(cache_dir, content_hash, variant):
+    return os.path.join(cache_dir, f'data-{content_hash}-{variant}.parquet')
+
+
+def _write_atomically(path, write):
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    write(temporary_path)
+    os.replace(temporary_path, path)
+
+
+def cached_read(file_path, parse, variant, cache_dir):
+    """Return parse(file_path), reusing the cached frame when the source file has not changed.
+
+    variant names the parsing options so that different parses of the same file are cached separately.
+    """
+    if not parquet_available():
+        print("Booking cache disabled: install pyarrow to enable it.")
+        return parse(file_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    status = os.stat(file_path)
+    entry_path = _source_entry_path(cache_dir, file_path)
+    entry = {}
+    if os.path.exists(entry_path):
+        with open(entry_path) as handle:
+            entry = json.load(handle)
+    # Fast path: same size and modification time means the file has not been touched since it was cached
+    content_hash = entry.get('sha256')
+    if entry.get('size') != status.st_size or entry.get('mtime_ns') != status.st_mtime_ns:
+        content_hash = file_content_hash(file_path)
+    data_path = _data_path(cache_dir, content_hash, variant)
+    if os.path.exists(data_path):
+        df = pd.read_parquet(data_path)
+        # Parquet stores missing strings as nulls which come back as None, pandas' CSV reader gives NaN
+        for column in df.select_dtypes(include='object').columns:
+            df[column] = df[column].where(df[column].notna(), float('nan'))
+    else:
+        df = parse(file_path)
+        _write_atomically(data_path, lambda path: df.to_parquet(path, index=False))
+    entry = {'path': os.path.abspath(file_path), 'size': status.st_size, 'mtime_ns': status.st_mtime_ns,
+             'sha256': content_hash}
+    _write_atomically(entry_path, lambda path: _dump_json(entry, path))
+    return df
+
+
+def _dump_json(data, path):
+    with open(path, 'w') as handle:
+        json.dump(data, handle)
+
+
+def cache_stats(cache_dir):
+    """Return the number of sources, cached frames and bytes used by the cache directory."""
+    sources = frames = total_bytes = 0
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.startswith('source-') and name.endswith('.json'):
+                sources += 1
+            elif name.startswith('data-') and name.endswith('.parquet'):
+                frames += 1
+            total_bytes += os.path.getsize(path)
+    return {'cache_dir': cache_dir, 'sources': sources, 'frames': frames, 'bytes': total_bytes}
+
+
+def clear_cache(cache_dir):
+    """Delete the cache directory and everything in it."""
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the parsed booking data cache.")
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--cache-dir', default=default_cache_dir() or DEFAULT_CACHE_DIR,
+                        help=f"cache directory (defaults to ${CACHE_DIR_VARIABLE} or {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args(argv)
+    if args.command == 'stats':
+        stats = cache_stats(args.cache_dir)
+        print(f"Cache directory: {stats['cache_dir']}")
+        print(f"Sources: {stats['sources']}, cached frames: {stats['frames']}, size: {stats['bytes'] / 1e6:.2f} MB")
+    else:
+        clear_cache(args.cache_dir)
+        print(f"Cleared cache directory: {args.cache_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
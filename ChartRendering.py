@@ -0,0 +1,42 @@
+"""This module holds the plotting helpers shared by the weekly booking charts."""
+"""Points are drawn with one scatter call per chart and value labels are thinned on long histories,"""
+"""so the number of matplotlib artists no longer grows with one scatter per week."""
+
+
+import numpy as np
+
+
+def label_indices(count, max_labels=100, keep=None):
+    """Return the positions that should get a value label.
+
+    Every position is labelled when there are at most max_labels of them, otherwise every k-th one is,
+    plus any position flagged in the keep mask (for example the weeks above the threshold).
+    """
+    if max_labels is None or count <= max_labels:
+        return np.arange(count)
+    step = -(-count // max_labels)
+    selected = np.zeros(count, dtype=bool)
+    selected[::step] = True
+    if keep is not None:
+        selected |= np.asarray(keep, dtype=bool)
+    return np.flatnonzero(selected)
+
+
+def highlight_scatter(ax, x, y, highlight, highlight_color, other_color, **kwargs):
+    """Draw every point in a single scatter, using highlight_color where the highlight mask is set."""
+    colors = np.where(np.asarray(highlight, dtype=bool), highlight_color, other_color)
+    return ax.scatter(np.asarray(x), np.asarray(y), color=list(colors), **kwargs)
+
+
+def annotate_values(ax, x, y, labels, indices, **kwargs):
+    """Annotate the selected points with their labels, the keyword arguments are passed to ax.annotate."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    return [ax.annotate(labels[i], (x[i], y[i]), **kwargs) for i in indices]
+
+
+def text_values(ax, x, y, labels, indices, **kwargs):
+    """Place the selected labels with ax.text at data coordinates, the keyword arguments are passed through."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    return [ax.text(x[i], y[i], labels[i], **kwargs) for i in indices]
@@ -0,0 +1,129 @@
+"""This module shrinks the memory used by booking frames."""
+"""Repeated labels such as 'Reference', 'Attendee Status' and 'Attended' are stored as categoricals, dates stay datetime64"""
+"""and per booking week numbers are narrowed to the smallest integer type that holds them, so bigger exports fit in memory."""
+
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Columns of the booking export that only ever hold a few repeated labels
+CATEGORY_COLUMNS = ('Reference', 'Attendee Status', 'Attended')
+
+# read_csv dtypes that parse the label columns straight into categoricals, columns missing from a file are ignored
+CATEGORY_DTYPES = {column: 'category' for column in CATEGORY_COLUMNS}
+
+# Other text columns become categoricals when they have at most this many distinct values per row
+CATEGORY_RATIO = 0.5
+
+
+def frame_memory(df):
+    """Return the bytes used by a frame, counting the Python strings inside object columns."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def smallest_integer_dtype(values, smallest=np.int16):
+    """Return the narrowest integer dtype, no narrower than smallest, that holds every value.
+
+    int16 is the default floor so that sums and midpoints of week numbers cannot overflow.
+    """
+    values = np.asarray(values)
+    if values.size == 0:
+        return np.dtype(smallest)
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        if np.dtype(dtype).itemsize < np.dtype(smallest).itemsize:
+            continue
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def downcast_integers(values, smallest=np.int16):
+    """Return integer values (a Series or an array) in the narrowest integer dtype that holds them."""
+    return values.astype(smallest_integer_dtype(values, smallest))
+
+
+def compact_frame(df, category_ratio=CATEGORY_RATIO):
+    """Convert the columns of df in place to compact dtypes and return it.
+
+    Object columns become categoricals when they are known label columns or repeat enough
+    (at most category_ratio distinct values per row), and int64 columns are downcast.
+    Unique identifiers such as BookingReference stay as they are, a categorical would only add codes.
+    """
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object:
+            if column in CATEGORY_COLUMNS or values.nunique(dropna=True) <= category_ratio * len(values):
+                df[column] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values.dtype) and values.dtype.itemsize > 2:
+            df[column] = downcast_integers(values)
+    return df
+
+
+def value_counts_order(counts, values):
+    """Return the non zero counts per category of values in the order Series.value_counts gives for plain labels.
+
+    counts is indexed by the categories. value_counts lists the labels by first appearance and then sorts by
+    count, so tied labels keep the order in which they first appear in the file rather than the category order.
+    """
+    codes = values.cat.codes.to_numpy()
+    first_seen = pd.unique(codes[codes >= 0])
+    return counts.iloc[first_seen].astype(np.int64).sort_values(ascending=False).rename('count')
+
+
+def describe_as_read(df):
+    """Return df.describe() as it is on the frame before compacting, without converting any column.
+
+    describe() on a categorical breaks ties for 'top' by category order instead of by the first label in
+    the file, so the 'top' of every categorical column is taken from its own counts in value_counts order.
+    """
+    described = df.describe()
+    if 'top' not in described.index:
+        return described
+    for column in described.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(values.cat.categories)),
+                               index=values.cat.categories)
+            ordered = value_counts_order(counts, values)
+            if len(ordered):
+                described.loc['top', column] = ordered.index[0]
+    return described
+
+
+def memory_by_column(df):
+    """Return the bytes used by every column of df."""
+    return df.memory_usage(index=False, deep=True)
+
+
+def compare_memory(before, after):
+    """Return a table of the bytes every column used before and after compacting, with a Total row."""
+    table = pd.DataFrame({'before': memory_by_column(before), 'after': memory_by_column(after),
+                          'dtype before': before.dtypes.astype(str), 'dtype after': after.dtypes.astype(str)})
+    table.loc['Total'] = [frame_memory(before), frame_memory(after), '', '']
+    table['saved %'] = (1 - table['after'].astype(float) / table['before'].astype(float)) * 100
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show how much memory the compact booking dtypes save on a CSV.")
+    parser.add_argument('file_path')
+    args = parser.parse_args(argv)
+    from AnalyticsCore import add_sequential_weeks, parse_bookings
+
+    before = parse_bookings(args.file_path, compact=False)
+    add_sequential_weeks(before, compact=False)
+    after = parse_bookings(args.file_path)
+    add_sequential_weeks(after)
+    table = compare_memory(before, after)
+    print(table.to_string(formatters={'saved %': '{:.1f}'.format}))
+    saved = table.loc['Total', 'before'] - table.loc['Total', 'after']
+    print(f"\nCompact dtypes save {saved / 2 ** 20:.2f} MiB ({table.loc['Total', 'saved %']:.1f}%) on {args.file_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
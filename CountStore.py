@@ -0,0 +1,172 @@
+"""This module keeps the weekly booking counts of every analysed file in one compact binary store."""
+"""All counts live back to back in counts.bin as little endian int32 and index.json records where each source's weeks"""
+"""start, so the whole history is opened with a memory map and questions across events (week 12 of every event, the"""
+"""highest z-score ever) are answered without reading any CSV or excel report again."""
+
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from StatsEngine import series_matrix, z_scores
+
+DEFAULT_STORE_DIR = '.count_store'
+COUNT_DTYPE = np.dtype('<i4')
+STORE_VERSION = 1
+
+
+def source_key(file_path):
+    """Return the name a file's counts are stored under, its absolute path, so files that share a name in
+    different folders never replace each other's counts."""
+    return os.path.abspath(file_path)
+
+
+class CountStore:
+    """Weekly count series by source (see source_key), stored in directory as counts.bin plus index.json.
+
+    Putting a source again appends its new counts and points the index at them, compact() reclaims the old space.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR):
+        self.directory = directory
+        self.data_path = os.path.join(directory, 'counts.bin')
+        self.index_path = os.path.join(directory, 'index.json')
+        os.makedirs(directory, exist_ok=True)
+        self.index = {'version': STORE_VERSION, 'dtype': COUNT_DTYPE.str, 'sources': {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as handle:
+                self.index = json.load(handle)
+            if self.index.get('version') != STORE_VERSION:
+                raise ValueError(f"Unsupported count store version {self.index.get('version')} in {directory}")
+        self._counts = None
+
+    @property
+    def sources(self):
+        return self.index['sources']
+
+    def names(self):
+        return list(self.sources)
+
+    def counts(self):
+        """Return the memory mapped array of every stored count."""
+        if self._counts is None:
+            size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+            if size == 0:
+                return np.zeros(0, dtype=COUNT_DTYPE)
+            self._counts = np.memmap(self.data_path, dtype=COUNT_DTYPE, mode='r')
+        return self._counts
+
+    def put(self, name, weekly_counts, stats=None):
+        """Store the weekly counts of a source, replacing the ones stored before. Call save() to keep the index."""
+        weekly_counts = np.asarray(weekly_counts)
+        if weekly_counts.size and (weekly_counts.min() < 0 or weekly_counts.max() > np.iinfo(COUNT_DTYPE).max):
+            raise ValueError(f"Weekly counts of {name} do not fit in {COUNT_DTYPE}")
+        self._counts = None
+        with open(self.data_path, 'ab') as handle:
+            offset = handle.tell() // COUNT_DTYPE.itemsize
+            handle.write(weekly_counts.astype(COUNT_DTYPE).tobytes())
+        entry = {'offset': offset, 'weeks': int(weekly_counts.size), 'updated': time.time()}
+        if stats:
+            entry.update({key: float(stats[key]) for key in ('mean', 'std', 'threshold') if key in stats})
+            if stats.get('first_monday') is not None:
+                entry['first_monday'] = f"{stats['first_monday']:%Y-%m-%d}"
+        self.sources[name] = entry
+        return entry
+
+    def save(self):
+        """Write the index atomically, after the counts it points to are on disk."""
+        temporary_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as handle:
+            json.dump(self.index, handle, indent=1)
+        os.replace(temporary_path, self.index_path)
+
+    def series(self, name):
+        """Return the weekly counts of one source as a read only view of the memory map."""
+        entry = self.sources[name]
+        return self.counts()[entry['offset']:entry['offset'] + entry['weeks']]
+
+    def matrix(self, names=None):
+        """Return (names, matrix) with one row of weekly counts per source, NaN past each source's last week."""
+        names = self.names() if names is None else list(names)
+        return names, series_matrix([self.series(name) for name in names])
+
+    def week_across_sources(self, week):
+        """Return {source: bookings in sequential week number week} for every source that has that week."""
+        return {name: int(self.series(name)[week - 1]) for name, entry in self.sources.items()
+                if 1 <= week <= entry['weeks']}
+
+    def max_z_score(self):
+        """Return (source, week, z-score) of the highest weekly z-score in the store, per source population z-scores."""
+        names, matrix = self.matrix()
+        # Padding and sources whose weeks all have the same count give NaN z-scores
+        scores = z_scores(matrix)
+        if np.isnan(scores).all():
+            return None
+        row, column = np.unravel_index(np.nanargmax(scores), scores.shape)
+        return names[row], int(column) + 1, float(scores[row, column])
+
+    def compact(self):
+        """Rewrite counts.bin with only the counts the index points to, in source order."""
+        names, arrays = self.names(), [np.array(self.series(name)) for name in self.names()]
+        self._counts = None
+        temporary_path = f'{self.data_path}.{os.getpid()}.tmp'
+        offset = 0
+        with open(temporary_path, 'wb') as handle:
+            for name, array in zip(names, arrays):
+                handle.write(array.astype(COUNT_DTYPE).tobytes())
+                self.sources[name]['offset'] = offset
+                offset += array.size
+        os.replace(temporary_path, self.data_path)
+        self.save()
+
+
+def store_results(directory, results):
+    """Put the weekly counts of successful BatchAnalytics results into the store in directory and save it."""
+    store = CountStore(directory)
+    for result in results:
+        if result['ok'] and 'counts' in result:
+            store.put(source_key(result['file']), result['counts'], result.get('stats'))
+    store.save()
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the weekly booking counts stored by BatchAnalytics --store.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="count store directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help="analyse csv files and store their weekly counts")
+    add.add_argument('file_paths', nargs='+')
+    commands.add_parser('list', help="list the stored sources")
+    week = commands.add_parser('week', help="bookings in one sequential week of every source")
+    week.add_argument('week', type=int)
+    commands.add_parser('max-z', help="highest weekly z-score across all sources")
+    commands.add_parser('compact', help="drop counts no longer referenced by the index")
+    args = parser.parse_args(argv)
+    store = CountStore(args.store)
+    if args.command == 'add':
+        from AnalyticsCore import analyse_booking_file
+
+        for file_path in args.file_paths:
+            booking_counts_complete, stats = analyse_booking_file(file_path)
+            store.put(source_key(file_path), booking_counts_complete['Number of Bookings'], stats)
+        store.save()
+    elif args.command == 'list':
+        for name, entry in store.sources.items():
+            print(f"{name:<30} {entry['weeks']:>5} weeks  from {entry.get('first_monday', '?')}  "
+                  f"threshold {entry.get('threshold', float('nan')):.2f}")
+    elif args.command == 'week':
+        for name, count in store.week_across_sources(args.week).items():
+            print(f"{name:<30} {count}")
+    elif args.command == 'max-z':
+        found = store.max_z_score()
+        print("No stored counts" if found is None else f"{found[0]} week {found[1]}: z-score {found[2]:.4f}")
+    elif args.command == 'compact':
+        store.compact()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
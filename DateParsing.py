@@ -0,0 +1,46 @@
+"""This module parses the 'Created Date' column of booking exports."""
+"""Booking dates repeat heavily, so every distinct string is parsed only once and the results are mapped back to the rows."""
+"""Dates that match none of the accepted formats are reported instead of stopping the whole run."""
+
+
+import numpy as np
+import pandas as pd
+
+# DD/MM/YYYY is the export format, the others are tried in order for the values it does not match
+DATE_FORMATS = ('%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%y', '%Y-%m-%d')
+
+
+def parse_booking_dates(values, formats=DATE_FORMATS):
+    """Parse booking date strings, trying each format in turn on the distinct values it has not matched yet.
+
+    Returns (dates, malformed): dates is a datetime64 Series aligned with values (NaT where parsing failed)
+    and malformed is a boolean Series marking the rows that are missing or match none of the formats.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, values.isna()
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    remaining = np.ones(len(text), dtype=bool)
+    for date_format in formats:
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(text[remaining], format=date_format, errors='coerce')
+        parsed[remaining] = attempt.to_numpy()
+        remaining &= parsed.isna().to_numpy()
+    # Missing values get code -1 from factorize and come out as NaT
+    dates = pd.Series(parsed.to_numpy().take(codes), index=values.index, name=values.name)
+    dates[codes < 0] = pd.NaT
+    return dates, dates.isna()
+
+
+def report_malformed_dates(values, malformed, source, column='Created Date', examples=5):
+    """Print how many rows of source had a missing or unreadable date, with a few example values."""
+    count = int(malformed.sum())
+    if not count:
+        return 0
+    samples = pd.Series(values)[malformed.to_numpy()].astype(str).unique()[:examples]
+    print(f"Warning: skipped {count} rows of {source} with a missing or malformed '{column}', "
+          f"for example: {', '.join(samples)}")
+    return count
@@ -4,75 +4,65 @@
 
 
 # All the necassary libraries are imported 
-import pandas as pd
 import matplotlib.pyplot as plt
-from scipy.stats import zscore
 import os
-import xlsxwriter
+from functools import partial
+from AnalyticsCore import analyse_booking_file
+from IncrementalAnalytics import update_weekly_counts
+from ChartRendering import annotate_values, highlight_scatter, label_indices
+from ReportWriter import write_weekly_report
+from Instrumentation import span
+from WeeklyAggregate import is_aggregate_file, source_name
+from SampledAnalytics import approximate_analysis, progressive_results
 
-# Define the main function for booking activity analysis and plotting
-def plot_booking_activity_analysis_and_display_table(file_path):
-    # Reads the CSV file, also skips the first row which is assumed to be a header if it is necessary
-    df = pd.read_csv(file_path, skiprows=1)
-    # for easier manioulation, Convert the 'Created Date' column to datetime format
-    df['Created Date'] = pd.to_datetime(df['Created Date'], format='%d/%m/%Y')
-    # Finds the earliest and latest dates in the 'Created Date' column
-    start_date = df['Created Date'].min()
-    end_date = df['Created Date'].max()
-    # Calculates the number of days to the first monday from the start date
-    days_to_monday = (start_date.weekday() - 0) % 7
-    # Adjusts the start date to the first monday
-    first_monday = start_date - pd.Timedelta(days=days_to_monday)
-    # Calculates the sequential week numbers for each booking
-    df['Sequential Week Number'] = ((df['Created Date'] - first_monday).dt.days // 7) + 1
-    # Creates a dataframe with all the possible week numbers
-    all_weeks = pd.DataFrame({'Sequential Week Number': range(1, ((end_date - first_monday).days // 7) + 2)})
-    # Groups the data by week and then counts the number of bookings per week
-    booking_counts = df.groupby('Sequential Week Number').size().reset_index(name='Number of Bookings')
-    # Merges all_weeks dataframe with the booking_counts to include weeks with zero bookings
-    booking_counts_complete = pd.merge(all_weeks, booking_counts, on='Sequential Week Number', how='left').fillna(0)
-    
-    # Calculates the mean bookings to establish a threshold for high activity
-    mean_bookings = booking_counts_complete['Number of Bookings'].mean()
-    # Manually calculates the variance and standard deviation to include the weeks which has zero bookings
-    diff_squared = (booking_counts_complete['Number of Bookings'] - mean_bookings) ** 2
-    variance = diff_squared.mean()
-    std_bookings = variance ** 0.5
-    # Defines the threshold as two standard deviation above the mean
-    threshold_value = mean_bookings + 2 * std_bookings
-    # Calculates the z-scores for booking counts
-    booking_counts_complete['z-score'] = ((booking_counts_complete['Number of Bookings'] - mean_bookings) / std_bookings).round(4)
-    # Sets the plot style and creates a figure and axes for plotting
-    plt.style.use('classic')
-    fig, ax = plt.subplots(figsize=(16, 12))
+def draw_weekly_booking_chart(booking_counts_complete, stats, filename, max_labels=100, ax=None):
+    """Draw the weekly booking bar chart with its threshold line and return the figure.
+
+    Pass the axes of an existing figure to draw on it again instead of creating a new 16x12 figure,
+    the 'classic' style must already be applied in that case (see RenderService).
+    Approximate results (see SampledAnalytics) get error bars and the range of their threshold.
+    """
+    threshold_value = stats['threshold']
+    if ax is None:
+        # Sets the plot style and creates a figure and axes for plotting
+        plt.style.use('classic')
+        fig, ax = plt.subplots(figsize=(16, 12))
+    else:
+        # Removes the previous chart's artists and keeps the figure
+        ax.cla()
+        fig = ax.figure
     # Sets the figure and axes the background color
     fig.patch.set_facecolor('white')
     ax.set_facecolor('white')
     # Plots the number of bookings per week as bars
-    bars = ax.bar(booking_counts_complete['Sequential Week Number'], booking_counts_complete['Number of Bookings'], color='skyblue', alpha=0.7, width=1)
-    # Annotates each bar with the height (number of bookings)
-    for bar in bars:
-        height = bar.get_height()
-        ax.annotate(f'{int(height)}',
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
+    weeks = booking_counts_complete['Sequential Week Number'].to_numpy()
+    counts = booking_counts_complete['Number of Bookings'].to_numpy()
+    above_threshold = counts > threshold_value
+    ax.bar(weeks, counts, color='skyblue', alpha=0.7, width=1)
+    approximate = stats.get('approximate', False)
+    if approximate:
+        # Shows how far each estimated count may be from the exact one
+        ax.errorbar(weeks, counts, yerr=[counts - booking_counts_complete['Lower Bound'].to_numpy(),
+                                         booking_counts_complete['Upper Bound'].to_numpy() - counts],
+                    fmt='none', ecolor='gray', capsize=2)
+    # Annotates the bars with the number of bookings, thinning the labels when there are too many weeks
+    labels = [f'{int(height)}' for height in counts]
+    annotate_values(ax, weeks, counts, labels, label_indices(len(counts), max_labels, keep=above_threshold),
                     # 3 points vertical offest
-                    xytext=(0, 3),  
+                    xytext=(0, 3),
                     textcoords="offset points",
                     ha='center', va='bottom')
-    # highlights weeks with bookings above the threshold value
-    for i, row in booking_counts_complete.iterrows():
-        color = 'red' if row['Number of Bookings'] > threshold_value else 'black'
-        ax.scatter(row['Sequential Week Number'], row['Number of Bookings'], color=color)
+    # highlights weeks with bookings above the threshold value, all points are drawn in one scatter
+    highlight_scatter(ax, weeks, counts, above_threshold, 'red', 'black')
     # Sets the x and y labels
     ax.set_xlabel('Week No.')
     ax.set_ylabel('Number of Bookings')
     # Sets the title for the plot
-    filename = os.path.basename(file_path)
-    ax.set_title(f'Booking Count by Week ({filename})')
+    ax.set_title(f'Booking Count by Week ({filename})' + (', approximate' if approximate else ''))
     # Add gridlines for easier readability
     ax.grid(True, color='gray', linestyle='--', linewidth=0.5)
     # Adjusts x-axis ticks which is based on the number of weeks
-    total_weeks = len(all_weeks)
+    total_weeks = len(booking_counts_complete)
     if total_weeks > 50:
         ax.set_xticks(range(1, total_weeks + 1, 5))
     else:
@@ -81,50 +71,105 @@ def plot_booking_activity_analysis_and_display_table(file_path):
     # Draws a horizontal line at the threshold value
     ax.axhline(y=threshold_value, color='darkorange', linestyle='--', linewidth=2)
     # Adds the text label for the threshold value
-    ax.text(len(all_weeks) + 0.5, threshold_value, f"Threshold: {threshold_value:.2f}", va='center', ha='left', color='white', backgroundcolor='black', bbox=dict(facecolor='black', edgecolor='orange', boxstyle="round,pad=0.3"))
-    plt.tight_layout()
-    # Saves the plot image to a file
-    base_directory = os.path.dirname(file_path)
-    filename_without_extension = os.path.splitext(os.path.basename(file_path))[0]
+    threshold_label = f"Threshold: {threshold_value:.2f}"
+    if approximate:
+        threshold_label += "\n({:.2f} - {:.2f})".format(*stats['threshold_bounds'])
+    ax.text(total_weeks + 0.5, threshold_value, threshold_label, va='center', ha='left', color='white', backgroundcolor='black', bbox=dict(facecolor='black', edgecolor='orange', boxstyle="round,pad=0.3"))
+    fig.tight_layout()
+    return fig
+
+
+def report_paths(file_path, output_directory=None):
+    """Return the chart and excel report paths of a CSV, creating the Images and reports folders."""
+    base_directory = output_directory if output_directory is not None else os.path.dirname(file_path)
+    filename_without_extension = source_name(file_path)
     image_directory = os.path.join(base_directory, "Images")
     os.makedirs(image_directory, exist_ok=True)
     image_file_path = os.path.join(image_directory, f"{filename_without_extension}.png")
-    plt.savefig(image_file_path, dpi=300, bbox_inches='tight')
-    print(f"Plot image saved at: {image_file_path}")
-    plt.show()
-    # Creates an excel file with booking data and analysis
     excel_filename = f"datareport_{filename_without_extension}.xlsx"
     excel_folder = os.path.join(base_directory, "reports")
     os.makedirs(excel_folder, exist_ok=True)
-    excel_filepath = os.path.join(excel_folder, excel_filename)
-    workbook = xlsxwriter.Workbook(excel_filepath)
-    worksheet = workbook.add_worksheet()
-    # Defines formats for the excel sheet headers and data and for styling them to
-    heading_format = workbook.add_format({'bold': True, 'font_color': 'white', 'bg_color': 'black', 'border': 1})
-    data_format = workbook.add_format({'border': 1, 'align': 'center', 'num_format': '0.0000'})
-    headings = ['Sequential Week Number', 'Number of Bookings', 'z-score']
-    # Writes the column headings
-    worksheet.write_row('A1', headings, heading_format)
-    # Writes the data rows, applying background color for z-scores above the value 2
-    for row, data in enumerate(booking_counts_complete.values, start=1):
-        for col, value in enumerate(data):
-            format_to_use = data_format
-            if col == 2 and value > 2:
-                format_to_use = workbook.add_format({'border': 1, 'align': 'center', 'num_format': '0.0000', 'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
-            worksheet.write(row, col, value, format_to_use)
-    # Writes the summary data below the main table
-    summary_row_start = len(booking_counts_complete) + 3
-    summary_data = [("Threshold", threshold_value), ("Mean", mean_bookings), ("Standard Deviation", std_bookings)]
-    summary_heading_format = workbook.add_format({'bold': True, 'font_color': 'white', 'bg_color': 'black', 'border': 1})
-    summary_data_format = workbook.add_format({'border': 1, 'align': 'center', 'num_format': '0.0000'})
-    for i, (label, value) in enumerate(summary_data):
-        worksheet.write(summary_row_start + i, 0, label, summary_heading_format)
-        worksheet.write(summary_row_start + i, 1, value, summary_data_format)
-    # Closes the workbook to save the excel file
-    workbook.close()
+    return image_file_path, os.path.join(excel_folder, excel_filename)
+
+# Define the main function for booking activity analysis and plotting
+def plot_booking_activity_analysis_and_display_table(file_path, show=True, output_directory=None, chunksize=None,
+                                                    max_labels=100, state_dir=None, run=None, renderer=None,
+                                                    on_analysed=None, approximate=False, split_workers=None):
+    """Analyse one booking CSV, save its chart and excel report and return both paths.
+
+    file_path may also be a weekly aggregate saved by WeeklyAggregate.py instead of the CSV.
+    Set show to False for unattended runs so plt.show() does not block, and pass
+    output_directory to write Images/ and reports/ somewhere other than next to the CSV.
+    A chunksize streams the 'Created Date' column in chunks so very large exports fit in memory.
+    When there are more than max_labels weeks only every few bars (and every bar above the threshold) is labelled.
+    With a state_dir only the rows appended since the previous run are read (see IncrementalAnalytics).
+    Pass an Instrumentation run to record the time and memory of every stage.
+    With a RenderService as renderer the chart is drawn in one of its worker processes while the
+    excel report is written here, show is ignored then.
+    on_analysed is called with the weekly counts and stats before anything is drawn, for example to store them.
+    With approximate set a chart estimated from a sample of the CSV is drawn (and shown) first while the exact
+    pass reads the whole file, then the exact chart and report replace it.
+    split_workers counts one large CSV in that many processes, each parsing its own byte range (see SplitAnalytics).
+    """
+    # Reads the CSV file and counts the bookings per week, including the weeks with zero bookings
+    chart_ax = None
+    if state_dir:
+        with span(run, 'read'):
+            booking_counts_complete, stats, _ = update_weekly_counts(file_path, state_dir=state_dir)
+    elif approximate and not is_aggregate_file(file_path):
+        # Draws a chart estimated from a sample of the file while the exact pass reads all of it in the background
+        results = progressive_results(partial(approximate_analysis, file_path),
+                                      partial(analyse_booking_file, file_path, chunksize=chunksize, run=run,
+                                              split_workers=split_workers))
+        booking_counts_complete, stats = next(results)
+        image_file_path, _ = report_paths(file_path, output_directory)
+        fig = draw_weekly_booking_chart(booking_counts_complete, stats, os.path.basename(file_path), max_labels=max_labels)
+        chart_ax = fig.axes[0]
+        fig.savefig(image_file_path, dpi=300, bbox_inches='tight')
+        print(f"Approximate plot image saved at: {image_file_path}")
+        if show:
+            # Paints the window without blocking, the exact chart is drawn into it when ready
+            plt.show(block=False)
+            plt.pause(0.001)
+        booking_counts_complete, stats = next(results)
+    else:
+        booking_counts_complete, stats = analyse_booking_file(file_path, chunksize=chunksize, run=run,
+                                                              split_workers=split_workers)
+    if on_analysed is not None:
+        on_analysed(booking_counts_complete, stats)
+    image_file_path, excel_filepath = report_paths(file_path, output_directory)
+    pending_chart = None
+    if renderer is not None:
+        # Hands the chart to a render worker, it is drawn while the excel report is written below
+        pending_chart = renderer.submit(booking_counts_complete, stats, os.path.basename(file_path), image_file_path,
+                                        max_labels=max_labels)
+        if chart_ax is not None:
+            plt.close(chart_ax.figure)
+    else:
+        # Draws the weekly bar chart with the threshold line, replacing the approximate one if it was drawn
+        with span(run, 'render'):
+            fig = draw_weekly_booking_chart(booking_counts_complete, stats, os.path.basename(file_path), max_labels=max_labels,
+                                            ax=chart_ax)
+        # Saves the plot image to a file
+        with span(run, 'savefig'):
+            fig.savefig(image_file_path, dpi=300, bbox_inches='tight')
+        print(f"Plot image saved at: {image_file_path}")
+        if show:
+            plt.show()
+        # Releases the figure so long batch runs do not keep every chart in memory
+        plt.close(fig)
+    # Writes the weekly table, highlighting z-scores above 2, and the summary rows below it
+    with span(run, 'xlsx'):
+        write_weekly_report(excel_filepath, booking_counts_complete, stats)
     print(f"Excel file saved successfully: {excel_filepath}")
+    if pending_chart is not None:
+        pending_chart.result()
+        print(f"Plot image saved at: {image_file_path}")
+    return image_file_path, excel_filepath
+
+if __name__ == "__main__":
+    # Add the CSV file path here where the data files are located. Example D19.csv
+    file_path = 'C:\\Users\\Jyothesh karnam\\Desktop\\collaborative application development\\Data Files\\SRM22.csv'
+    # Call the function
+    plot_booking_activity_analysis_and_display_table(file_path)
 
-# Add the CSV file path here where the data files are located. Example D19.csv
-file_path = 'C:\\Users\\Jyothesh karnam\\Desktop\\collaborative application development\\Data Files\\SRM22.csv'
-# Call the function
-plot_booking_activity_analysis_and_display_table(file_path)
@@ -0,0 +1,210 @@
+"""This module keeps the weekly booking counts of a growing CSV up to date without re-reading the whole file."""
+"""A small state file per source remembers how far the CSV has been read, the counts per week and the running sums,"""
+"""so each run only parses the rows appended since the previous one."""
+
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from DateParsing import parse_booking_dates, report_malformed_dates
+
+DEFAULT_STATE_DIR = '.booking_state'
+
+# Number of bytes at the start of the file whose hash detects a file that was replaced rather than appended to
+PREFIX_BYTES = 64 * 1024
+# Appended rows are read and folded this many bytes at a time, so a first run over a large file stays small in memory
+READ_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def state_file_path(state_dir, file_path):
+    """Return the state file used for one source CSV."""
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(state_dir, f'{key}.json')
+
+
+def _prefix_hash(handle, length):
+    handle.seek(0)
+    return hashlib.sha256(handle.read(min(length, PREFIX_BYTES))).hexdigest()
+
+
+def _new_state(handle, file_path):
+    # The first line is the export banner that the other scripts skip, the second one is the header
+    handle.seek(0)
+    handle.readline()
+    header = handle.readline().decode('utf-8-sig').strip()
+    columns = [column.strip() for column in next(csv.reader([header]))]
+    if 'Created Date' not in columns:
+        raise ValueError(f"Column 'Created Date' not found in {file_path}")
+    return {'path': os.path.abspath(file_path), 'date_index': columns.index('Created Date'), 'columns': len(columns),
+            'offset': handle.tell(), 'first_monday': None, 'week_counts': [], 'total': 0, 'sum_of_squares': 0}
+
+
+def load_state(file_path, state_dir=DEFAULT_STATE_DIR):
+    """Return the saved state for a source, or None when it has not been processed yet."""
+    path = state_file_path(state_dir, file_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save_state(state, file_path, state_dir=DEFAULT_STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    path = state_file_path(state_dir, file_path)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as handle:
+        json.dump(state, handle)
+    os.replace(temporary_path, path)
+
+
+def _fold_new_days(state, days):
+    """Add bookings (given as days since 1970-01-01) into the weekly counts and the running sums."""
+    first_monday = state['first_monday']
+    earliest = int(days.min())
+    # Monday is weekday 0; 1970-01-01 was a thursday, hence the offset of 3
+    earliest_monday = earliest - (earliest + 3) % 7
+    week_counts = state['week_counts']
+    if first_monday is None:
+        first_monday = earliest_monday
+    elif earliest_monday < first_monday:
+        # Rows older than anything seen so far move week 1 back, so earlier weeks are prepended as zeros
+        week_counts = [0] * ((first_monday - earliest_monday) // 7) + week_counts
+        first_monday = earliest_monday
+    week_index = (days - first_monday) // 7
+    additions = np.bincount(week_index)
+    if len(additions) > len(week_counts):
+        week_counts = week_counts + [0] * (len(additions) - len(week_counts))
+    # Only the touched weeks change the sum of squares: (c + a)^2 - c^2 for each of them
+    for week in np.flatnonzero(additions):
+        old_count = week_counts[week]
+        new_count = old_count + int(additions[week])
+        state['sum_of_squares'] += new_count * new_count - old_count * old_count
+        week_counts[week] = new_count
+    state['total'] += int(additions.sum())
+    state['week_counts'] = week_counts
+    state['first_monday'] = first_monday
+
+
+def _complete_line_blocks(handle, block_size=READ_BLOCK_BYTES):
+    """Yield the bytes from the handle's position onwards in blocks of about block_size that end on a line break.
+
+    A half written last line is never yielded, it is picked up by the next run.
+    """
+    pending = b''
+    while block := handle.read(block_size):
+        pending += block
+        end = pending.rfind(b'\n') + 1
+        if end:
+            yield pending[:end]
+            pending = pending[end:]
+
+
+def _is_complete_row(state, line):
+    """Return True when a last line without a line break holds every column of the header."""
+    if not line.strip():
+        return False
+    fields = next(csv.reader([line.decode('utf-8', errors='replace')]), [])
+    # States saved before the column count was recorded only need the date column
+    return len(fields) >= state.get('columns', state['date_index'] + 1)
+
+
+def _fold_block(state, block):
+    """Fold the rows of one block of complete lines into the state, return (new rows, malformed date values)."""
+    if not block.strip():
+        return 0, None
+    chunk = pd.read_csv(io.BytesIO(block), header=None, usecols=[state['date_index']], skip_blank_lines=True)
+    dates, malformed = parse_booking_dates(chunk[state['date_index']])
+    days = dates[~malformed].to_numpy().astype('datetime64[D]').astype(np.int64)
+    if len(days):
+        _fold_new_days(state, days)
+    return len(days), (chunk[state['date_index']][malformed] if malformed.any() else None)
+
+
+def update_weekly_counts(file_path, state_dir=DEFAULT_STATE_DIR, num_std=2):
+    """Fold the rows appended to file_path since the last run into its saved weekly counts.
+
+    The file is re-read from the start when it is new, shorter than before or its beginning has changed.
+    A last row without a line break is counted in the result but not saved, so the next run reads it again
+    from its start and it is counted once whether it was complete or was still being written.
+    Returns (booking_counts_complete, stats, new_rows) in the same shape as AnalyticsCore.analyse_booking_file.
+    """
+    state = load_state(file_path, state_dir)
+    with open(file_path, 'rb') as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if state is not None and (size < state['offset'] or _prefix_hash(handle, state['offset']) != state['prefix_sha256']):
+            state = None
+        if state is None:
+            state = _new_state(handle, file_path)
+        handle.seek(state['offset'])
+        new_rows = 0
+        malformed_values = []
+        # Only complete lines are processed, block by block, so the appended rows are never held in memory at once
+        for block in _complete_line_blocks(handle):
+            rows, bad_values = _fold_block(state, block)
+            new_rows += rows
+            if bad_values is not None:
+                malformed_values.append(bad_values)
+            state['offset'] += len(block)
+        state['prefix_sha256'] = _prefix_hash(handle, state['offset'])
+        # Every line before the offset ends on a line break, so at most one unterminated line is left after it
+        handle.seek(state['offset'])
+        last_line = handle.read()
+    if malformed_values:
+        bad_values = pd.concat(malformed_values, ignore_index=True)
+        report_malformed_dates(bad_values, pd.Series(True, index=bad_values.index), file_path)
+    save_state(state, file_path, state_dir)
+    if _is_complete_row(state, last_line):
+        # Folded into a copy, the saved state still ends where the unterminated line starts
+        state = dict(state, week_counts=list(state['week_counts']))
+        rows, _ = _fold_block(state, last_line + b'\n')
+        new_rows += rows
+    booking_counts_complete, stats = weekly_counts_from_state(state, num_std=num_std)
+    return booking_counts_complete, stats, new_rows
+
+
+def weekly_counts_from_state(state, num_std=2):
+    """Build booking_counts_complete and its stats from the running sums kept in a state."""
+    if state['first_monday'] is None:
+        raise ValueError(f"No bookings found in {state['path']}")
+    counts = np.array(state['week_counts'], dtype=np.int64)
+    booking_counts_complete = pd.DataFrame({'Sequential Week Number': np.arange(1, len(counts) + 1),
+                                            'Number of Bookings': counts})
+    # Mean and population variance come straight from the running sums, including the weeks with zero bookings.
+    # The sums are integers, so n * sum of squares - total^2 is exact and is 0 when every week has the same count
+    weeks = len(counts)
+    mean_bookings = state['total'] / weeks
+    variance = (weeks * state['sum_of_squares'] - state['total'] ** 2) / weeks ** 2
+    std_bookings = variance ** 0.5
+    # Every week equals the mean when the spread is 0, so their z-scores are 0 rather than 0 / 0
+    z_scores = (counts - mean_bookings) / std_bookings if std_bookings else np.zeros(weeks)
+    booking_counts_complete['z-score'] = z_scores.round(4)
+    stats = {'threshold': mean_bookings + num_std * std_bookings, 'mean': mean_bookings, 'std': std_bookings,
+             'first_monday': pd.Timestamp(state['first_monday'], unit='D')}
+    return booking_counts_complete, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the weekly booking counts with rows appended since the last run.")
+    parser.add_argument('file_path')
+    parser.add_argument('--state-dir', default=DEFAULT_STATE_DIR)
+    parser.add_argument('--reset', action='store_true', help="forget the saved state and re-read the whole file")
+    args = parser.parse_args(argv)
+    if args.reset:
+        path = state_file_path(args.state_dir, args.file_path)
+        if os.path.exists(path):
+            os.remove(path)
+    booking_counts_complete, stats, new_rows = update_weekly_counts(args.file_path, state_dir=args.state_dir)
+    print(f"{new_rows} new bookings, {len(booking_counts_complete)} weeks in total")
+    print(f"Threshold: {stats['threshold']:.4f}, Mean: {stats['mean']:.4f}, Standard Deviation: {stats['std']:.4f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
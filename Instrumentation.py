@@ -0,0 +1,115 @@
+"""This module records how long each stage of a report run takes and how much memory it uses."""
+"""Stages are wrapped in named spans that record wall time, CPU time, peak RSS and optionally the tracemalloc peak."""
+"""A finished run can be appended to a JSON lines file or saved as a Chrome trace (open it in chrome://tracing)."""
+
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def peak_rss_bytes():
+    """Return the peak resident memory of this process in bytes, or None when it cannot be measured."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    # On Windows psutil exposes the peak working set directly
+    return getattr(memory, 'peak_wset', memory.rss)
+
+
+def new_run(name, trace_memory=False):
+    """Start recording a run. With trace_memory the Python allocation peak of each span is recorded too."""
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return {'run': name, 'pid': os.getpid(), 'started': time.time(), 'trace_memory': trace_memory,
+            '_origin': time.perf_counter(), 'spans': []}
+
+
+@contextmanager
+def span(run, name):
+    """Record the block as a named span of run. Passing None for run makes the span a no-op."""
+    if run is None:
+        yield
+        return
+    if run['trace_memory']:
+        tracemalloc.reset_peak()
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield
+    finally:
+        record = {'name': name,
+                  'start': wall_started - run['_origin'],
+                  'wall': time.perf_counter() - wall_started,
+                  'cpu': time.process_time() - cpu_started,
+                  'peak_rss': peak_rss_bytes()}
+        if run['trace_memory']:
+            record['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+        run['spans'].append(record)
+
+
+def finish_run(run):
+    """Stop recording and return the run as a plain JSON serialisable dictionary."""
+    if run['trace_memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    finished = {key: value for key, value in run.items() if not key.startswith('_')}
+    finished['wall'] = time.perf_counter() - run['_origin']
+    return finished
+
+
+def merge_run(record, other):
+    """Add the spans of another finished run (for example the chart drawn by a render worker) to record.
+
+    The spans keep the process id they were recorded in, and their start times are moved onto record's clock.
+    """
+    shift = other['started'] - record['started']
+    for item in other['spans']:
+        record['spans'].append(dict(item, start=item['start'] + shift, pid=other['pid']))
+    record['wall'] = max(record['wall'], shift + other['wall'])
+    return record
+
+
+def append_json_line(record, path):
+    """Append one finished run to a JSON lines file."""
+    with open(path, 'a') as handle:
+        handle.write(json.dumps(record) + '\n')
+
+
+def write_chrome_trace(records, path):
+    """Save finished runs in the Chrome trace event format, one row per process."""
+    events = []
+    for record in records:
+        origin = record['started'] * 1e6
+        for item in record['spans']:
+            args = {key: item[key] for key in ('cpu', 'peak_rss', 'tracemalloc_peak') if key in item}
+            args['run'] = record['run']
+            events.append({'name': item['name'], 'ph': 'X', 'pid': item.get('pid', record['pid']), 'tid': 0,
+                           'ts': origin + item['start'] * 1e6, 'dur': item['wall'] * 1e6, 'args': args})
+    with open(path, 'w') as handle:
+        json.dump({'traceEvents': events}, handle)
+
+
+def span_percentiles(records, percentiles=(50, 90, 99)):
+    """Return the wall time percentiles of every span name across many finished runs."""
+    import numpy as np
+
+    walls = {}
+    for record in records:
+        for item in record['spans']:
+            walls.setdefault(item['name'], []).append(item['wall'])
+        walls.setdefault('total', []).append(record['wall'])
+    return {name: dict(zip((f'p{p}' for p in percentiles), np.percentile(values, percentiles).tolist()))
+            for name, values in walls.items()}
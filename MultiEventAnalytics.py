@@ -0,0 +1,155 @@
+"""This script compares the weekly booking activity of many events in one pass."""
+"""All booking files are loaded into one frame tagged with their file name, and the weekly counts, z-scores and"""
+"""thresholds of every file and of all events together are computed with grouped operations instead of one run per file."""
+"""The results go into one workbook with a summary sheet and one sheet per file."""
+
+
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from AnalyticsCore import read_bookings
+from BatchAnalytics import find_booking_files, source_labels
+from ReportWriter import add_report_formats, write_summary, write_weekly_table
+from StatsEngine import percentile_thresholds, trend_fits
+
+ALL_EVENTS = 'All events'
+
+
+def read_many_bookings(file_paths):
+    """Read the booking dates of many CSV files into one frame with a categorical 'Source File' column.
+
+    Files are labelled by name, or by their path below the shared folder when names repeat across folders.
+    Files that cannot be read are reported and left out, so one bad file does not stop the comparison.
+    """
+    frames = []
+    for file_path, label in zip(file_paths, source_labels(file_paths)):
+        try:
+            df = read_bookings(file_path)
+        except Exception as error:
+            print(f"Skipping {label}: {type(error).__name__}: {error}")
+            continue
+        frames.append(pd.DataFrame({'Source File': label, 'Created Date': df['Created Date']}))
+    if not frames:
+        raise ValueError("None of the booking files could be read")
+    bookings = pd.concat(frames, ignore_index=True)
+    bookings['Source File'] = pd.Categorical(bookings['Source File'], categories=[frame['Source File'].iloc[0]
+                                                                                  for frame in frames])
+    return bookings
+
+
+def _weekly_counts_by_group(groups, dates, num_std):
+    """Count bookings per group and sequential week, filling empty weeks, and add z-scores per group.
+
+    Every group gets its own week 1 starting on the monday on or before its first booking.
+    """
+    start_dates = dates.groupby(groups, observed=True).transform('min')
+    # Adjusts each group's start date to its first monday
+    first_mondays = start_dates - pd.to_timedelta(start_dates.dt.weekday, unit='D')
+    week_numbers = ((dates - first_mondays).dt.days // 7) + 1
+    counts = week_numbers.groupby([groups, week_numbers], observed=True).size()
+    # Reindexes onto every week from 1 to each group's last week so weeks with zero bookings are included
+    last_weeks = pd.Series(counts.index.get_level_values(1)).groupby(counts.index.get_level_values(0),
+                                                                       observed=True).max()
+    full_index = pd.MultiIndex.from_arrays([np.repeat(last_weeks.index, last_weeks.to_numpy()),
+                                            np.concatenate([np.arange(1, last + 1) for last in last_weeks])],
+                                           names=['Source File', 'Sequential Week Number'])
+    counts = counts.reindex(full_index, fill_value=0)
+    weekly = counts.rename('Number of Bookings').reset_index()
+    booking_counts = weekly['Number of Bookings'].astype(float)
+    by_group = booking_counts.groupby(weekly['Source File'], observed=True)
+    # Population mean and standard deviation per group, so weeks with zero bookings count fully
+    means = by_group.transform('mean')
+    stds = ((booking_counts - means) ** 2).groupby(weekly['Source File'], observed=True).transform('mean') ** 0.5
+    weekly['z-score'] = ((booking_counts - means) / stds).round(4)
+    summary = pd.DataFrame({'mean': by_group.mean(),
+                            'std': stds.groupby(weekly['Source File'], observed=True).first()})
+    summary['threshold'] = summary['mean'] + num_std * summary['std']
+    summary['first_monday'] = first_mondays.groupby(groups, observed=True).first()
+    summary['weeks'] = by_group.size()
+    summary['total bookings'] = by_group.sum().astype(int)
+    summary['max z-score'] = weekly['z-score'].groupby(weekly['Source File'], observed=True).max()
+    above = booking_counts > weekly['Source File'].map(summary['threshold']).astype(float)
+    summary['weeks above threshold'] = above.groupby(weekly['Source File'], observed=True).sum()
+    # One row per group and one column per week (NaN past a group's last week) for the matrix wide figures
+    matrix = weekly.pivot(index='Source File', columns='Sequential Week Number', values='Number of Bookings')
+    matrix = matrix.reindex(summary.index).to_numpy(dtype=float)
+    summary['trend slope'], _ = trend_fits(matrix)
+    summary['p80 threshold'] = percentile_thresholds(matrix, 80)
+    return weekly, summary
+
+
+def multi_source_weekly_counts(bookings, num_std=2):
+    """Compute weekly counts, z-scores and thresholds for every file and for all events together.
+
+    Returns (weekly, summary): weekly has one row per file and week, with the 'All events' series last, and
+    summary has one row per file with its mean, std, threshold and a few comparison figures.
+    """
+    per_file, per_file_summary = _weekly_counts_by_group(bookings['Source File'], bookings['Created Date'], num_std)
+    # All events share one calendar, counted from the monday before the earliest booking of any file
+    all_events = pd.Series(ALL_EVENTS, index=bookings.index)
+    combined, combined_summary = _weekly_counts_by_group(all_events, bookings['Created Date'], num_std)
+    weekly = pd.concat([per_file.astype({'Source File': str}), combined], ignore_index=True)
+    summary = pd.concat([per_file_summary.set_axis(per_file_summary.index.astype(str)), combined_summary])
+    summary.index.name = 'Source File'
+    return weekly, summary
+
+
+def _sheet_name(name, used):
+    # Excel sheet names are limited to 31 characters and cannot contain []:*?/\
+    base = re.sub(r'[\[\]:*?/\\]', '_', os.path.splitext(name)[0])[:31] or 'Sheet'
+    candidate, suffix = base, 2
+    while candidate.lower() in used:
+        candidate = f"{base[:31 - len(str(suffix)) - 1]}~{suffix}"
+        suffix += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def write_multi_source_report(excel_filepath, weekly, summary):
+    """Write one workbook with a summary sheet followed by the weekly table of every file and of all events."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(excel_filepath, {'nan_inf_to_errors': True})
+    formats = add_report_formats(workbook)
+    used_names = {'summary'}
+    summary_sheet = workbook.add_worksheet('Summary')
+    columns = ['weeks', 'total bookings', 'mean', 'std', 'threshold', 'max z-score', 'weeks above threshold',
+               'trend slope', 'p80 threshold']
+    summary_sheet.write_row(0, 0, ['Source File'] + columns, formats['heading'])
+    summary_sheet.write_column(1, 0, summary.index.tolist(), formats['heading'])
+    for col, column in enumerate(columns, start=1):
+        summary_sheet.write_column(1, col, summary[column].to_numpy(dtype=float), formats['data'])
+    summary_sheet.set_column(0, 0, 30)
+    summary_sheet.set_column(1, len(columns), 14)
+    for source, table in weekly.groupby('Source File', sort=False):
+        worksheet = workbook.add_worksheet(_sheet_name(source, used_names))
+        next_row = write_weekly_table(worksheet, formats, table)
+        write_summary(worksheet, formats, summary.loc[source], next_row + 1)
+    workbook.close()
+    return excel_filepath
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the weekly booking activity of many events in one workbook.")
+    parser.add_argument('source', help="a directory of csv files or a glob pattern")
+    parser.add_argument('-o', '--output', default='combined_report.xlsx', help="workbook to write")
+    parser.add_argument('--num-std', type=float, default=2, help="threshold = mean + NUM_STD standard deviations")
+    args = parser.parse_args(argv)
+    file_paths = find_booking_files(args.source)
+    if not file_paths:
+        print(f"No csv files found for: {args.source}")
+        return 1
+    bookings = read_many_bookings(file_paths)
+    weekly, summary = multi_source_weekly_counts(bookings, num_std=args.num_std)
+    write_multi_source_report(args.output, weekly, summary)
+    print(summary[['weeks', 'total bookings', 'threshold', 'weeks above threshold']].to_string())
+    print(f"Excel file saved successfully: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
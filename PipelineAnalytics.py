@@ -0,0 +1,158 @@
+"""This script runs the FinalAnalytics report over many csv files as an asyncio pipeline."""
+"""Stages are joined by bounded queues: file discovery, csv reading in a thread pool, the weekly analysis, then chart"""
+"""rendering and excel writing in a process pool. The next files are read while earlier ones are analysed and drawn,"""
+"""and a full queue makes the stage before it wait, so only a few files are ever held in memory at once."""
+
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from BatchAnalytics import find_booking_files, output_collisions, output_directories, print_batch_summary
+
+# Marks the end of a queue, one is sent for every consumer of the queue
+_DONE = None
+
+
+def read_one_file(file_path, chunksize=None):
+    """Read stage: return the parsed bookings, or the streamed weekly counts when chunksize is set."""
+    from AnalyticsCore import read_bookings, stream_weekly_counts
+
+    if chunksize:
+        return {'weekly': stream_weekly_counts(file_path, chunksize=chunksize)}
+    return {'frame': read_bookings(file_path)}
+
+
+def analyse_one_file(data, num_std=2):
+    """Analysis stage: return (booking_counts_complete, stats) from the output of read_one_file."""
+    from AnalyticsCore import analyse_bookings, weekly_analysis
+
+    if 'weekly' in data:
+        return weekly_analysis(*data['weekly'], num_std=num_std)
+    return analyse_bookings(data['frame'], num_std=num_std)
+
+
+def write_file_outputs(file_path, booking_counts_complete, stats, output_directory=None, max_labels=100):
+    """Output stage, run in a worker process: save the chart and the excel report, return both paths."""
+    from FinalAnalytics import report_paths
+    from RenderService import render_weekly_chart
+    from ReportWriter import write_weekly_report
+
+    image_file_path, excel_filepath = report_paths(file_path, output_directory)
+    render_weekly_chart(booking_counts_complete, stats, os.path.basename(file_path), image_file_path,
+                        max_labels=max_labels)
+    write_weekly_report(excel_filepath, booking_counts_complete, stats)
+    return image_file_path, excel_filepath
+
+
+def _failure(file_path, error, started):
+    return {"file": file_path, "ok": False, "error": f"{type(error).__name__}: {error}",
+            "seconds": time.perf_counter() - started}
+
+
+async def run_pipeline(source, read_workers=2, output_workers=None, queue_size=4, output_directory=None,
+                       chunksize=None, num_std=2):
+    """Analyse every booking csv found in source and return one result dictionary per file, in file order.
+
+    read_workers threads read csv files, one analysis task computes the weekly counts and output_workers
+    processes draw the charts and write the reports. Every queue holds at most queue_size files.
+    """
+    from RenderService import init_render_worker
+
+    file_paths = find_booking_files(source)
+    if not file_paths:
+        print(f"No csv files found for: {source}")
+        return []
+    directories = output_directories(file_paths, output_directory)
+    # Files that would overwrite each other's outputs fail straight away and never enter the pipeline
+    results = output_collisions(directories)
+    remaining = [file_path for file_path in file_paths if file_path not in results]
+    output_workers = output_workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    paths = asyncio.Queue(maxsize=queue_size)
+    frames = asyncio.Queue(maxsize=queue_size)
+    analysed = asyncio.Queue(maxsize=queue_size)
+    started = {}
+
+    async def discover():
+        for file_path in remaining:
+            started[file_path] = time.perf_counter()
+            await paths.put(file_path)
+        for _ in range(read_workers):
+            await paths.put(_DONE)
+
+    async def read(executor):
+        while (file_path := await paths.get()) is not _DONE:
+            try:
+                data = await loop.run_in_executor(executor, read_one_file, file_path, chunksize)
+            except Exception as error:
+                results[file_path] = _failure(file_path, error, started[file_path])
+                continue
+            await frames.put((file_path, data))
+        await frames.put(_DONE)
+
+    async def analyse(executor):
+        # Waits for the end marker of every reader before telling the writers to stop
+        remaining = read_workers
+        while remaining:
+            item = await frames.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            file_path, data = item
+            try:
+                weekly = await loop.run_in_executor(executor, analyse_one_file, data, num_std)
+            except Exception as error:
+                results[file_path] = _failure(file_path, error, started[file_path])
+                continue
+            await analysed.put((file_path, weekly))
+        for _ in range(output_workers):
+            await analysed.put(_DONE)
+
+    async def output(executor):
+        while (item := await analysed.get()) is not _DONE:
+            file_path, (booking_counts_complete, stats) = item
+            try:
+                image_file_path, excel_filepath = await loop.run_in_executor(
+                    executor, write_file_outputs, file_path, booking_counts_complete, stats, directories[file_path])
+            except Exception as error:
+                results[file_path] = _failure(file_path, error, started[file_path])
+                continue
+            results[file_path] = {"file": file_path, "ok": True, "image": image_file_path, "report": excel_filepath,
+                                  "seconds": time.perf_counter() - started[file_path]}
+
+    with ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='read') as read_executor, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='analyse') as analyse_executor, \
+            ProcessPoolExecutor(max_workers=output_workers, initializer=init_render_worker) as output_executor:
+        await asyncio.gather(discover(),
+                             *(read(read_executor) for _ in range(read_workers)),
+                             analyse(analyse_executor),
+                             *(output(output_executor) for _ in range(output_workers)))
+    return [results[file_path] for file_path in file_paths]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the booking activity analysis over many csv files as a pipeline.")
+    parser.add_argument("source", help="a directory of csv files or a glob pattern such as 'Data Files/*.csv'")
+    parser.add_argument("--read-workers", type=int, default=2, help="threads reading csv files")
+    parser.add_argument("--output-workers", type=int, default=None,
+                        help="processes drawing charts and writing reports (defaults to the number of CPUs)")
+    parser.add_argument("--queue-size", type=int, default=4, help="files each stage may hold before the previous waits")
+    parser.add_argument("-o", "--output-directory", default=None,
+                        help="where to create Images/ and reports/ (defaults to next to each csv file)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream each csv in chunks of this many rows to keep memory flat on very large files")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    results = asyncio.run(run_pipeline(args.source, read_workers=args.read_workers, output_workers=args.output_workers,
+                                       queue_size=args.queue_size, output_directory=args.output_directory,
+                                       chunksize=args.chunksize))
+    print_batch_summary(results)
+    print(f"Finished in {time.perf_counter() - started:.2f}s")
+    return 1 if any(not result["ok"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
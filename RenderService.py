@@ -0,0 +1,131 @@
+"""This module draws the weekly booking charts in a pool of worker processes with the non interactive Agg backend."""
+"""Every worker applies the 'classic' style and creates its 16x12 figure once, then clears and redraws the same axes"""
+"""for each chart, so the calling process can keep reading csv files and writing reports while the charts are drawn."""
+
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Instrumentation import finish_run, new_run, span
+
+# The figure and axes reused by the charts drawn in this worker process
+_figure = None
+_axes = None
+
+
+def init_render_worker():
+    """Select the Agg backend, apply the chart style and create the figure this process reuses."""
+    global _figure, _axes
+    # The backend has to be selected before pyplot is imported
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.style.use('classic')
+    _figure, _axes = plt.subplots(figsize=(16, 12))
+
+
+def render_weekly_chart(booking_counts_complete, stats, filename, image_file_path, max_labels=100, instrument=False):
+    """Worker entry point: draw one weekly chart on the reused axes and save it as image_file_path.
+
+    Returns (image_file_path, record) where record holds the render and savefig timings when instrument is set.
+    """
+    if _axes is None:
+        init_render_worker()
+    from FinalAnalytics import draw_weekly_booking_chart
+
+    run = new_run(filename) if instrument else None
+    with span(run, 'render'):
+        draw_weekly_booking_chart(booking_counts_complete, stats, filename, max_labels=max_labels, ax=_axes)
+    with span(run, 'savefig'):
+        _figure.savefig(image_file_path, dpi=300, bbox_inches='tight')
+    return image_file_path, finish_run(run) if run is not None else None
+
+
+class RenderService:
+    """A pool of render worker processes, use it as a context manager and submit() one chart at a time."""
+
+    def __init__(self, workers=None):
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker)
+
+    def submit(self, booking_counts_complete, stats, filename, image_file_path, max_labels=100, instrument=False):
+        """Queue one chart and return a Future of (image_file_path, record)."""
+        return self.executor.submit(render_weekly_chart, booking_counts_complete, stats, filename, image_file_path,
+                                    max_labels, instrument)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def benchmark_render_service(booking_counts_complete, stats, charts=20, workers=None,
+                             output_directory='render_benchmark'):
+    """Draw the same chart charts times in three ways and return the charts per second of each.
+
+    new_figure builds a new figure per chart in this process (as FinalAnalytics does), reused_figure
+    redraws one figure in this process and service uses a RenderService with workers processes.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    from FinalAnalytics import draw_weekly_booking_chart
+
+    os.makedirs(output_directory, exist_ok=True)
+    paths = [os.path.join(output_directory, f"chart_{index}.png") for index in range(charts)]
+    results = {}
+
+    started = time.perf_counter()
+    for path in paths:
+        fig = draw_weekly_booking_chart(booking_counts_complete, stats, 'benchmark')
+        fig.savefig(path, dpi=300, bbox_inches='tight')
+        plt.close(fig)
+    results['new_figure'] = charts / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for path in paths:
+        render_weekly_chart(booking_counts_complete, stats, 'benchmark', path)
+    results['reused_figure'] = charts / (time.perf_counter() - started)
+
+    with RenderService(workers) as service:
+        # Draws one chart per worker before timing so process start up and imports are not counted
+        warm_up = [service.submit(booking_counts_complete, stats, 'benchmark', path)
+                   for path in paths[:workers or os.cpu_count()]]
+        for future in warm_up:
+            future.result()
+        started = time.perf_counter()
+        futures = [service.submit(booking_counts_complete, stats, 'benchmark', path) for path in paths]
+        for future in futures:
+            future.result()
+        results['service'] = charts / (time.perf_counter() - started)
+    shutil.rmtree(output_directory, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure weekly chart rendering throughput in charts per second.")
+    parser.add_argument('file_path', help="booking csv whose weekly chart is drawn repeatedly")
+    parser.add_argument('--charts', type=int, default=20, help="number of charts to draw in each mode")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="render worker processes (defaults to CPUs)")
+    parser.add_argument('--output-directory', default='render_benchmark', help="scratch folder, removed afterwards")
+    args = parser.parse_args(argv)
+    from AnalyticsCore import analyse_booking_file
+
+    booking_counts_complete, stats = analyse_booking_file(args.file_path)
+    results = benchmark_render_service(booking_counts_complete, stats, charts=args.charts, workers=args.workers,
+                                       output_directory=args.output_directory)
+    for mode, charts_per_second in results.items():
+        print(f"{mode:<14} {charts_per_second:.2f} charts/s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
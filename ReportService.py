@@ -0,0 +1,240 @@
+"""This script runs a local HTTP service that answers report requests for the booking CSV files of one folder."""
+"""pandas, matplotlib and the analysis modules are loaded once, results are kept in a least recently used cache and"""
+"""a background thread polls the folder and precomputes the reports of new or changed files."""
+"""It only listens on localhost by default and needs nothing but the standard library and the usual analysis packages."""
+
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import matplotlib
+matplotlib.use('Agg')
+
+from AnalyticsCore import analyse_booking_file
+from RenderService import render_weekly_chart
+from ReportWriter import write_weekly_report
+
+ARTIFACTS = ('weekly', 'stats', 'chart', 'report')
+
+
+class LRUCache:
+    """A thread safe mapping that keeps at most max_entries items, dropping the least recently used first."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class ReportService:
+    """Computes and caches the weekly counts, stats, chart and excel report of the CSV files in data_dir.
+
+    Cache keys include the file's size and modification time, so a changed file is never served stale.
+    """
+
+    def __init__(self, data_dir, max_entries=64, num_std=2):
+        self.data_dir = os.path.abspath(data_dir)
+        self.num_std = num_std
+        self.cache = LRUCache(max_entries)
+        # pyplot is not thread safe and the chart figure is shared, so charts are drawn one at a time
+        self.render_lock = threading.Lock()
+
+    def list_files(self):
+        return sorted(entry.name for entry in os.scandir(self.data_dir)
+                      if entry.is_file() and entry.name.lower().endswith('.csv'))
+
+    def file_path(self, name):
+        """Return the path of a CSV in data_dir, refusing names that point anywhere else."""
+        if not name or os.path.basename(name) != name or not name.lower().endswith('.csv'):
+            raise ValueError(f"Not a csv file name: {name!r}")
+        path = os.path.join(self.data_dir, name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No such csv file: {name}")
+        return path
+
+    def signature(self, name):
+        status = os.stat(self.file_path(name))
+        return status.st_size, status.st_mtime_ns
+
+    def _cached(self, name, artifact, compute):
+        key = (name, self.signature(name), artifact)
+        value = self.cache.get(key)
+        if value is None:
+            value = compute(name)
+            self.cache.put(key, value)
+        return value
+
+    def analysis(self, name):
+        """Return (booking_counts_complete, stats) of a file."""
+        return self._cached(name, 'analysis',
+                            lambda name: analyse_booking_file(self.file_path(name), num_std=self.num_std))
+
+    def weekly(self, name):
+        booking_counts_complete, _ = self.analysis(name)
+        return booking_counts_complete.to_dict(orient='records')
+
+    def stats(self, name):
+        _, stats = self.analysis(name)
+        return {key: value.isoformat() if hasattr(value, 'isoformat') else float(value)
+                for key, value in stats.items()}
+
+    def chart(self, name):
+        """Return the PNG bytes of a file's weekly chart."""
+        def draw(name):
+            booking_counts_complete, stats = self.analysis(name)
+            image = io.BytesIO()
+            with self.render_lock:
+                render_weekly_chart(booking_counts_complete, stats, name, image)
+            return image.getvalue()
+        return self._cached(name, 'chart', draw)
+
+    def report(self, name):
+        """Return the xlsx bytes of a file's excel report."""
+        def write(name):
+            booking_counts_complete, stats = self.analysis(name)
+            with tempfile.TemporaryDirectory() as directory:
+                excel_filepath = os.path.join(directory, 'report.xlsx')
+                write_weekly_report(excel_filepath, booking_counts_complete, stats)
+                with open(excel_filepath, 'rb') as handle:
+                    return handle.read()
+        return self._cached(name, 'report', write)
+
+    def precompute(self, name):
+        """Compute every artifact of a file so later requests are served from the cache."""
+        self.chart(name)
+        self.report(name)
+
+    def watch(self, interval=2.0, stop=None):
+        """Poll data_dir every interval seconds and precompute the files that are new or have changed."""
+        stop = stop or threading.Event()
+        done = {}
+        pending = {}
+        while not stop.is_set():
+            for name in self.list_files():
+                try:
+                    signature = self.signature(name)
+                except FileNotFoundError:
+                    continue
+                if done.get(name) == signature:
+                    continue
+                if pending.get(name) != signature:
+                    # A file still being copied changes between polls, it is only analysed once it stays the same
+                    pending[name] = signature
+                    continue
+                del pending[name]
+                done[name] = signature
+                try:
+                    self.precompute(name)
+                    print(f"Precomputed {name}")
+                except Exception as error:
+                    print(f"Could not precompute {name}: {type(error).__name__}: {error}")
+            stop.wait(interval)
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """GET /files, /cache, /weekly?file=NAME, /stats?file=NAME, /chart?file=NAME and /report?file=NAME."""
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        route = url.path.strip('/')
+        name = parse_qs(url.query).get('file', [None])[0]
+        try:
+            if route == 'files':
+                self._send_json(service.list_files())
+            elif route == 'cache':
+                self._send_json(service.cache.stats())
+            elif route in ('weekly', 'stats'):
+                self._send_json(getattr(service, route)(name))
+            elif route == 'chart':
+                self._send(service.chart(name), 'image/png')
+            elif route == 'report':
+                self._send(service.report(name),
+                           'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                           f"datareport_{os.path.splitext(name)[0]}.xlsx")
+            else:
+                self.send_error(404, f"Unknown route, use one of: files, cache, {', '.join(ARTIFACTS)}")
+        except ValueError as error:
+            self.send_error(400, str(error))
+        except FileNotFoundError as error:
+            self.send_error(404, str(error))
+        except Exception as error:
+            self.send_error(500, f"{type(error).__name__}: {error}")
+
+    def _send_json(self, value):
+        self._send(json.dumps(value, default=str).encode('utf-8'), 'application/json')
+
+    def _send(self, body, content_type, download_name=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if download_name:
+            self.send_header('Content-Disposition', f'attachment; filename="{download_name}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(service, host='127.0.0.1', port=8765):
+    """Create the HTTP server for a ReportService, call serve_forever() on it to start answering."""
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve weekly booking counts, stats, charts and reports over HTTP.")
+    parser.add_argument('data_dir', help="folder of booking csv files")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-entries', type=int, default=64, help="results kept in memory before evicting")
+    parser.add_argument('--poll', type=float, default=2.0, help="seconds between scans of the data folder, 0 to stop")
+    args = parser.parse_args(argv)
+    service = ReportService(args.data_dir, max_entries=args.cache_entries)
+    server = make_server(service, args.host, args.port)
+    stop = threading.Event()
+    if args.poll > 0:
+        threading.Thread(target=service.watch, args=(args.poll, stop), daemon=True).start()
+    print(f"Serving reports for {service.data_dir} on http://{args.host}:{args.port}/files")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
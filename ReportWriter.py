@@ -0,0 +1,102 @@
+"""This module writes the weekly booking excel report produced by FinalAnalytics."""
+"""Formats are created once, data is written a whole row or column at a time and z-scores above 2 are"""
+"""highlighted with one conditional format, so large reports stay fast and the style table stays small."""
+
+
+import argparse
+import time
+
+import xlsxwriter
+
+# Reports with more rows than this are written in xlsxwriter's constant_memory mode
+CONSTANT_MEMORY_ROWS = 50_000
+
+REPORT_HEADINGS = ['Sequential Week Number', 'Number of Bookings', 'z-score']
+
+
+def add_report_formats(workbook):
+    """Create the report formats once per workbook and return them by name."""
+    return {
+        'heading': workbook.add_format({'bold': True, 'font_color': 'white', 'bg_color': 'black', 'border': 1}),
+        'data': workbook.add_format({'border': 1, 'align': 'center', 'num_format': '0.0000'}),
+        # Conditional formats only carry the colours, the border and number format come from the cell format
+        'high_z_score': workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'}),
+    }
+
+
+def write_weekly_table(worksheet, formats, booking_counts_complete, constant_memory=False, first_row=0):
+    """Write the headings and weekly rows, then highlight z-scores above 2. Returns the next free row."""
+    columns = [booking_counts_complete[heading].to_numpy(dtype=float) for heading in REPORT_HEADINGS]
+    row_count = len(booking_counts_complete)
+    # Writes the column headings
+    worksheet.write_row(first_row, 0, REPORT_HEADINGS, formats['heading'])
+    if constant_memory:
+        # constant_memory mode flushes each row once the next one starts, so the data must go row by row
+        for row, values in enumerate(zip(*columns), start=first_row + 1):
+            worksheet.write_row(row, 0, values, formats['data'])
+    else:
+        for col, values in enumerate(columns):
+            worksheet.write_column(first_row + 1, col, values, formats['data'])
+    if row_count:
+        # Highlights z-scores above the value 2 with a single rule instead of a format per cell
+        worksheet.conditional_format(first_row + 1, 2, first_row + row_count, 2,
+                                     {'type': 'cell', 'criteria': '>', 'value': 2, 'format': formats['high_z_score']})
+    return first_row + row_count + 1
+
+
+def write_summary(worksheet, formats, stats, first_row):
+    """Write the threshold, mean and standard deviation as label/value rows starting at first_row."""
+    summary_data = [("Threshold", stats['threshold']), ("Mean", stats['mean']), ("Standard Deviation", stats['std'])]
+    for i, (label, value) in enumerate(summary_data):
+        worksheet.write(first_row + i, 0, label, formats['heading'])
+        worksheet.write(first_row + i, 1, value, formats['data'])
+
+
+def write_weekly_report(excel_filepath, booking_counts_complete, stats, constant_memory=None):
+    """Write the FinalAnalytics excel report: the weekly table followed by the summary rows.
+
+    constant_memory defaults to on for reports with more than CONSTANT_MEMORY_ROWS weeks.
+    """
+    if constant_memory is None:
+        constant_memory = len(booking_counts_complete) > CONSTANT_MEMORY_ROWS
+    workbook = xlsxwriter.Workbook(excel_filepath, {'constant_memory': constant_memory, 'nan_inf_to_errors': True})
+    worksheet = workbook.add_worksheet()
+    formats = add_report_formats(workbook)
+    write_weekly_table(worksheet, formats, booking_counts_complete, constant_memory=constant_memory)
+    # Writes the summary data below the main table, leaving one empty row
+    write_summary(worksheet, formats, stats, len(booking_counts_complete) + 3)
+    # Closes the workbook to save the excel file
+    workbook.close()
+    return excel_filepath
+
+
+def benchmark_report_writer(excel_filepath, rows=100_000, constant_memory=None):
+    """Write a synthetic report with the given number of rows and return the rows written per second."""
+    import numpy as np
+    import pandas as pd
+
+    counts = np.random.default_rng(0).poisson(20, rows).astype(float)
+    mean, std = counts.mean(), counts.std()
+    booking_counts_complete = pd.DataFrame({'Sequential Week Number': np.arange(1, rows + 1),
+                                            'Number of Bookings': counts,
+                                            'z-score': ((counts - mean) / std).round(4)})
+    stats = {'threshold': mean + 2 * std, 'mean': mean, 'std': std}
+    started = time.perf_counter()
+    write_weekly_report(excel_filepath, booking_counts_complete, stats, constant_memory=constant_memory)
+    return rows / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the excel report writer throughput.")
+    parser.add_argument('excel_filepath', help="where to write the synthetic report")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--constant-memory', choices=['auto', 'on', 'off'], default='auto')
+    args = parser.parse_args(argv)
+    constant_memory = {'auto': None, 'on': True, 'off': False}[args.constant_memory]
+    rows_per_second = benchmark_report_writer(args.excel_filepath, rows=args.rows, constant_memory=constant_memory)
+    print(f"Wrote {args.rows} rows at {rows_per_second:,.0f} rows per second")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,194 @@
+"""This module gives approximate weekly booking counts of very large CSV files from a sample of their bytes."""
+"""Evenly spaced byte ranges of the file are read (each one aligned to whole lines), the bookings found in them are"""
+"""scaled up by the share of the file they cover. The differences between neighbouring ranges give the error of every"""
+"""weekly count, which holds whether the rows are in date order or shuffled, and simulated counts carry it through to"""
+"""the z-scores, mean, standard deviation and threshold. progressive_results runs the exact pass in the background so"""
+"""the approximate chart can be replaced by the exact one as soon as it is ready."""
+
+
+import argparse
+import csv
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from DateParsing import parse_booking_dates
+from StatsEngine import mean_std_thresholds, z_scores
+from TimeBuckets import day_numbers, first_monday_day
+
+# Many small ranges follow the weeks of a date ordered export closely, 4096 ranges of 4 KiB read 16 MiB in total
+DEFAULT_BLOCKS = 4096
+DEFAULT_BLOCK_SIZE = 4 * 1024
+DEFAULT_REPLICATES = 200
+
+
+def data_layout(handle, file_path):
+    """Return the 'Created Date' column index and the offset of the first data row, after the optional banner line."""
+    handle.seek(0)
+    for _ in range(2):
+        line = handle.readline().decode('utf-8-sig')
+        columns = [column.strip() for column in next(csv.reader([line]), [])]
+        if 'Created Date' in columns:
+            return columns.index('Created Date'), handle.tell()
+    raise ValueError(f"Column 'Created Date' not found in {file_path}")
+
+
+def sample_ranges(data_start, data_end, blocks=DEFAULT_BLOCKS, block_size=DEFAULT_BLOCK_SIZE):
+    """Return evenly spaced (start, end) byte ranges, the first at data_start and the last ending at data_end.
+
+    When the ranges would cover all the data a single range over the whole of it is returned.
+    """
+    if blocks * block_size >= data_end - data_start:
+        return [(data_start, data_end)]
+    starts = np.linspace(data_start, data_end - block_size, blocks).astype(np.int64)
+    return [(int(start), int(start) + block_size) for start in starts]
+
+
+def next_line_start(handle, position, data_start):
+    """Return the offset of the first line starting at or after position."""
+    if position <= data_start:
+        return data_start
+    handle.seek(position - 1)
+    handle.readline()
+    return handle.tell()
+
+
+def lines_starting_in(handle, start, end, data_start):
+    """Return the bytes of the lines whose first byte is in [start, end)."""
+    # A line belongs to the range holding its first byte, so every line has the same chance of being sampled
+    begin, stop = next_line_start(handle, start, data_start), next_line_start(handle, end, data_start)
+    handle.seek(begin)
+    return handle.read(max(stop - begin, 0))
+
+
+def sample_booking_days(file_path, blocks=DEFAULT_BLOCKS, block_size=DEFAULT_BLOCK_SIZE):
+    """Read the bookings in evenly spaced byte ranges of a CSV.
+
+    Returns a dictionary with the day number and range of every sampled booking with a valid date, the number of
+    ranges, and the sampled and total data bytes.
+    """
+    with open(file_path, 'rb') as handle:
+        date_index, data_start = data_layout(handle, file_path)
+        data_end = os.fstat(handle.fileno()).st_size
+        ranges = sample_ranges(data_start, data_end, blocks, block_size)
+        pieces = [[line for line in lines_starting_in(handle, start, end, data_start).splitlines() if line.strip()]
+                  for start, end in ranges]
+    rows_per_range = np.array([len(lines) for lines in pieces], dtype=np.int64)
+    if rows_per_range.sum() == 0:
+        raise ValueError(f"No bookings found in {file_path}")
+    # All sampled lines are parsed in one go, the row counts of the ranges tell them apart again
+    sampled = pd.read_csv(io.BytesIO(b'\n'.join(line for lines in pieces for line in lines)), header=None,
+                          usecols=[date_index], dtype=str, skip_blank_lines=False)
+    dates, malformed = parse_booking_dates(sampled[date_index])
+    valid = ~malformed.to_numpy()
+    return {'days': day_numbers(dates[valid]),
+            'ranges': np.repeat(np.arange(len(ranges)), rows_per_range)[valid],
+            'range_count': len(ranges),
+            'sampled_bytes': sum(end - start for start, end in ranges),
+            'data_bytes': data_end - data_start}
+
+
+def approximate_analysis(file_path, num_std=2, blocks=DEFAULT_BLOCKS, block_size=DEFAULT_BLOCK_SIZE,
+                         replicates=DEFAULT_REPLICATES, confidence=95, seed=0):
+    """Estimate the FinalAnalytics weekly counts and stats of a CSV from blocks byte ranges of block_size bytes.
+
+    Returns (booking_counts_complete, stats) like AnalyticsCore.analyse_booking_file. The weekly frame also has
+    'Lower Bound', 'Upper Bound', 'z-score Lower' and 'z-score Upper', and stats adds 'approximate', the
+    'mean_bounds', 'std_bounds' and 'threshold_bounds' at the given confidence, 'sample_fraction' and
+    'estimated_rows'. The bounds come from replicates sets of simulated weekly counts. A file smaller than the
+    sample is read whole and its bounds equal its counts.
+    """
+    from AnalyticsCore import weekly_analysis
+
+    sample = sample_booking_days(file_path, blocks, block_size)
+    days, ranges, range_count = sample['days'], sample['ranges'], sample['range_count']
+    scale = sample['data_bytes'] / sample['sampled_bytes']
+    first_monday = first_monday_day(int(days.min()))
+    weeks = (days - first_monday) // 7
+    week_count = int(weeks.max()) + 1
+    # Bookings per sampled range and week, each range is one cluster of the sample
+    per_range = np.bincount(ranges * week_count + weeks, minlength=range_count * week_count)
+    per_range = per_range.reshape(range_count, week_count)
+    estimate = per_range.sum(axis=0) * scale
+    # Successive difference variance of a systematic sample: neighbouring ranges of a date ordered file hold the same
+    # weeks, so only the ranges at week boundaries add uncertainty, while for shuffled rows it is the usual variance
+    differences = (np.diff(per_range, axis=0) ** 2).sum(axis=0)
+    variance = scale ** 2 * range_count * (1 - 1 / scale) * differences / (2 * max(range_count - 1, 1))
+    replicate_counts = np.random.default_rng(seed).normal(estimate, np.sqrt(variance), size=(replicates, week_count))
+    replicate_counts = np.maximum(replicate_counts, 0)
+    tails = [(100 - confidence) / 2, 100 - (100 - confidence) / 2]
+    lower, upper = np.percentile(replicate_counts, tails, axis=0)
+    booking_counts_complete = pd.DataFrame({'Sequential Week Number': np.arange(1, week_count + 1),
+                                            'Number of Bookings': np.rint(estimate).astype(np.int64),
+                                            'Lower Bound': np.rint(lower).astype(np.int64),
+                                            'Upper Bound': np.rint(upper).astype(np.int64)})
+    booking_counts_complete, stats = weekly_analysis(booking_counts_complete,
+                                                     pd.Timestamp(first_monday, unit='D'), num_std=num_std)
+    means, stds, thresholds = mean_std_thresholds(replicate_counts, num_std)
+    z_lower, z_upper = np.nanpercentile(z_scores(replicate_counts), tails, axis=0)
+    booking_counts_complete['z-score Lower'] = z_lower.round(4)
+    booking_counts_complete['z-score Upper'] = z_upper.round(4)
+    stats.update({'approximate': True, 'confidence': confidence,
+                  'mean_bounds': tuple(np.percentile(means, tails)),
+                  'std_bounds': tuple(np.percentile(stds, tails)),
+                  'threshold_bounds': tuple(np.percentile(thresholds, tails)),
+                  'sample_fraction': sample['sampled_bytes'] / sample['data_bytes'],
+                  'estimated_rows': len(days) * scale})
+    return booking_counts_complete, stats
+
+
+def progressive_results(approximate, exact):
+    """Yield approximate() and then exact(), the exact pass runs in a background thread from the start.
+
+    Callers draw the first result straight away and replace it when the second one arrives.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='exact')
+    exact_result = executor.submit(exact)
+    # No more work is coming, the thread ends as soon as the exact pass is done
+    executor.shutdown(wait=False)
+    yield approximate()
+    yield exact_result.result()
+
+
+def print_approximate_stats(stats):
+    """Print the approximate mean, standard deviation and threshold with their bounds."""
+    print(f"Approximate from {stats['sample_fraction']:.2%} of the file, about {stats['estimated_rows']:,.0f} bookings "
+          f"({stats['confidence']}% bounds):")
+    for label, key in (("Mean", 'mean'), ("SD", 'std'), ("Threshold", 'threshold')):
+        low, high = stats[f'{key}_bounds']
+        print(f"  {label:<10} {stats[key]:10.4f}  [{low:.4f}, {high:.4f}]")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate the weekly booking figures of a large csv from a sample.")
+    parser.add_argument('file_path')
+    parser.add_argument('--num-std', type=float, default=2)
+    parser.add_argument('--blocks', type=int, default=DEFAULT_BLOCKS, help="number of byte ranges to read")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, help="bytes per range")
+    parser.add_argument('--exact', action='store_true', help="also run the exact pass and compare")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    booking_counts_complete, stats = approximate_analysis(args.file_path, num_std=args.num_std, blocks=args.blocks,
+                                                          block_size=args.block_size)
+    print(f"Approximate pass: {time.perf_counter() - started:.2f}s, {len(booking_counts_complete)} weeks")
+    print_approximate_stats(stats)
+    if args.exact:
+        from AnalyticsCore import analyse_booking_file
+
+        started = time.perf_counter()
+        exact_counts, exact_stats = analyse_booking_file(args.file_path, num_std=args.num_std)
+        print(f"Exact pass: {time.perf_counter() - started:.2f}s, {len(exact_counts)} weeks")
+        print(f"  Mean {exact_stats['mean']:.4f}  SD {exact_stats['std']:.4f}  Threshold {exact_stats['threshold']:.4f}")
+        if len(exact_counts) == len(booking_counts_complete):
+            inside = exact_counts['Number of Bookings'].between(booking_counts_complete['Lower Bound'],
+                                                                booking_counts_complete['Upper Bound'])
+            print(f"  {inside.mean():.0%} of the exact weekly counts are inside the approximate bounds")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
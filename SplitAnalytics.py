@@ -0,0 +1,127 @@
+"""This module counts the bookings of one large CSV in several worker processes."""
+"""The file is cut into byte ranges that start and end on line boundaries, every worker streams the 'Created Date'"""
+"""column of its own range into a calendar of bookings per day, and the partial calendars are added together. The"""
+"""weekly counts, mean, standard deviation and threshold are then computed once from the merged calendar, so a"""
+"""single file report uses every core and gives exactly the same result as reading the file in one process."""
+
+
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from DateParsing import parse_booking_dates, report_malformed_dates
+from SampledAnalytics import data_layout, next_line_start
+from TimeBuckets import calendar_from_dates, merge_calendars
+
+
+class ByteRangeReader(io.RawIOBase):
+    """A read only file object over bytes [start, end) of a file, so pandas can parse one range on its own."""
+
+    def __init__(self, file_path, start, end):
+        super().__init__()
+        self._handle = open(file_path, 'rb')
+        self._handle.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._handle.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._handle.close()
+        super().close()
+
+
+def split_ranges(file_path, parts):
+    """Return the 'Created Date' column index and parts (start, end) byte ranges of the data rows.
+
+    The ranges are about equally long, every one starts at the beginning of a line and together they cover
+    every data row exactly once.
+    """
+    with open(file_path, 'rb') as handle:
+        date_index, data_start = data_layout(handle, file_path)
+        data_end = os.fstat(handle.fileno()).st_size
+        step = (data_end - data_start) / parts
+        cuts = [data_start] + [next_line_start(handle, int(data_start + part * step), data_start)
+                               for part in range(1, parts)] + [data_end]
+    # Ranges shorter than one line collapse onto the same cut and are left out
+    return date_index, [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+def count_range(file_path, start, end, date_index, chunksize=1_000_000):
+    """Worker: return (calendar, malformed values) of the rows in one byte range, the calendar is None if empty."""
+    calendar = None
+    malformed_values = []
+    with ByteRangeReader(file_path, start, end) as reader:
+        chunks = pd.read_csv(reader, header=None, usecols=[date_index], dtype=str, chunksize=chunksize)
+        for chunk in chunks:
+            dates, malformed = parse_booking_dates(chunk[date_index])
+            if malformed.any():
+                malformed_values.append(chunk[date_index][malformed])
+            if not malformed.all():
+                calendar = merge_calendars([calendar, calendar_from_dates(dates)])
+    return calendar, (pd.concat(malformed_values, ignore_index=True) if malformed_values else None)
+
+
+def split_calendar(file_path, workers=None, chunksize=1_000_000):
+    """Return the TimeBuckets calendar of a booking CSV counted in workers processes, one byte range each.
+
+    The result is identical to AnalyticsCore.stream_calendar(file_path).
+    """
+    workers = workers or os.cpu_count() or 1
+    date_index, ranges = split_ranges(file_path, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges) or 1)) as executor:
+        futures = [executor.submit(count_range, file_path, start, end, date_index, chunksize) for start, end in ranges]
+        partials = [future.result() for future in futures]
+    bad_values = [values for _, values in partials if values is not None]
+    if bad_values:
+        bad_values = pd.concat(bad_values, ignore_index=True)
+        report_malformed_dates(bad_values, pd.Series(True, index=bad_values.index), file_path)
+    calendars = [calendar for calendar, _ in partials if calendar is not None]
+    if not calendars:
+        raise ValueError(f"No bookings found in {file_path}")
+    return merge_calendars(calendars)
+
+
+def benchmark_split(file_path, worker_counts, chunksize=1_000_000):
+    """Time stream_calendar against split_calendar with each number of workers and check they agree."""
+    import numpy as np
+
+    from AnalyticsCore import stream_calendar
+
+    started = time.perf_counter()
+    expected = stream_calendar(file_path, chunksize=chunksize)
+    timings = {'single process': time.perf_counter() - started}
+    for workers in worker_counts:
+        started = time.perf_counter()
+        calendar = split_calendar(file_path, workers=workers, chunksize=chunksize)
+        timings[f'{workers} workers'] = time.perf_counter() - started
+        if calendar['start_day'] != expected['start_day'] or not np.array_equal(calendar['counts'], expected['counts']):
+            raise AssertionError(f"Split counts with {workers} workers differ from the single process counts")
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare counting one csv in a single process and in split ranges.")
+    parser.add_argument('file_path')
+    parser.add_argument('--workers', type=int, nargs='+', default=[os.cpu_count() or 1],
+                        help="numbers of worker processes to time")
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help="rows each worker parses at a time")
+    args = parser.parse_args(argv)
+    print(f"{os.cpu_count()} CPUs")
+    for label, seconds in benchmark_split(args.file_path, args.workers, chunksize=args.chunksize).items():
+        print(f"{label:<16} {seconds:8.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
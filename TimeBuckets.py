@@ -0,0 +1,102 @@
+"""This module groups booking dates into daily, weekly, ISO week, monthly or elapsed-week buckets."""
+"""Dates are first turned into a calendar index (one booking count per day, as a NumPy array), and every granularity is"""
+"""computed from that index with integer arithmetic and a bincount, which also fills the empty buckets with zero."""
+"""Switching granularity therefore never needs the booking data again."""
+
+
+import numpy as np
+import pandas as pd
+
+# Column holding the bucket number for each granularity
+BUCKET_COLUMNS = {
+    'daily': 'Day Number',
+    'weekly': 'Sequential Week Number',
+    'isoweek': 'ISO Week',
+    'monthly': 'Month Number',
+    'interval': 'Time Interval',
+}
+
+GRANULARITIES = tuple(BUCKET_COLUMNS)
+
+
+def day_numbers(dates):
+    """Return the dates as int64 days since 1970-01-01, the unit of the calendar index."""
+    return np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+
+def calendar_from_days(days, weights=None):
+    """Build a calendar index from day numbers, optionally weighted (for example by bookings per day).
+
+    The calendar is a dictionary with start_day (the first day with a booking) and counts, the number
+    of bookings on every day from start_day to the last booking.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    if len(days) == 0:
+        raise ValueError("No bookings to build a calendar from")
+    start_day = int(days.min())
+    counts = np.bincount(days - start_day, weights=weights)
+    return {'start_day': start_day, 'counts': counts.astype(np.int64)}
+
+
+def calendar_from_dates(dates):
+    """Build a calendar index from a column of booking dates, ignoring missing dates."""
+    dates = pd.Series(dates)
+    return calendar_from_days(day_numbers(dates.dropna()))
+
+
+def merge_calendars(calendars):
+    """Add several calendars together, for example the partial calendars of the chunks of one file."""
+    calendars = [calendar for calendar in calendars if calendar is not None]
+    start_day = min(calendar['start_day'] for calendar in calendars)
+    end_day = max(calendar['start_day'] + len(calendar['counts']) for calendar in calendars)
+    counts = np.zeros(end_day - start_day, dtype=np.int64)
+    for calendar in calendars:
+        offset = calendar['start_day'] - start_day
+        counts[offset:offset + len(calendar['counts'])] += calendar['counts']
+    return {'start_day': start_day, 'counts': counts}
+
+
+def first_monday_day(start_day):
+    """Return the day number of the monday on or before start_day (1970-01-01 was a thursday)."""
+    return start_day - (start_day + 3) % 7
+
+
+def _bucket_ids(days, start_day, granularity):
+    # Every bucket id starts at 0 for the bucket holding start_day, so it can index a bincount directly
+    if granularity == 'daily':
+        return days - start_day, days
+    if granularity in ('weekly', 'isoweek'):
+        first_monday = first_monday_day(start_day)
+        ids = (days - first_monday) // 7
+        return ids, first_monday + 7 * ids
+    if granularity == 'interval':
+        ids = (days - start_day) // 7
+        return ids, start_day + 7 * ids
+    if granularity == 'monthly':
+        months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        ids = months - months[0]
+        return ids, (months[0] + ids).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    raise ValueError(f"Unknown granularity '{granularity}', choose one of: {', '.join(GRANULARITIES)}")
+
+
+def bucket_counts(calendar, granularity='weekly'):
+    """Return the bookings per bucket, with every bucket between the first and last booking present.
+
+    Buckets are numbered from 1. The frame has the bucket number column (see BUCKET_COLUMNS),
+    'Start Date' and 'Number of Bookings'; ISO weeks also get an 'ISO Label' such as 2024-W01, and
+    their numbering keeps counting across year ends instead of restarting at week 1.
+    """
+    counts = calendar['counts']
+    days = calendar['start_day'] + np.arange(len(counts), dtype=np.int64)
+    ids, bucket_starts = _bucket_ids(days, calendar['start_day'], granularity)
+    totals = np.bincount(ids, weights=counts).astype(np.int64)
+    # Every day of a bucket carries the same start date, writing them in reverse leaves one per bucket
+    starts = np.zeros(len(totals), dtype=np.int64)
+    starts[ids[::-1]] = bucket_starts[::-1]
+    result = pd.DataFrame({BUCKET_COLUMNS[granularity]: np.arange(1, len(totals) + 1),
+                           'Start Date': starts.astype('datetime64[D]').astype('datetime64[ns]'),
+                           'Number of Bookings': totals})
+    if granularity == 'isoweek':
+        iso = result['Start Date'].dt.isocalendar()
+        result['ISO Label'] = iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)
+    return result
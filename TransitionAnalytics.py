@@ -0,0 +1,132 @@
+"""This module computes the week over week transitions drawn by Analytics6.py and Analytics7.py."""
+"""Deltas, percentage changes, share of total changes and up/down run lengths come out as whole arrays in one pass,"""
+"""and the coloured rise/fall segments are drawn as a single LineCollection instead of one line per pair of weeks."""
+
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def percentage_change(counts, cap=100.0):
+    """Return the percentage change from the previous week, capped at cap percent as Analytics6 does.
+
+    The first week and weeks after a week with no bookings and no change are NaN, a rise from zero is capped.
+    """
+    counts = np.asarray(counts, dtype=float)
+    change = np.full(len(counts), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change[1:] = np.diff(counts) / counts[:-1]
+    # np.minimum keeps NaN, so weeks without a change stay unlabelled
+    return np.minimum(change, cap / 100) * 100
+
+
+def run_lengths(deltas):
+    """Return how many transitions in a row, up to and including each one, moved in the same direction.
+
+    Rises, falls and flat weeks each form their own runs.
+    """
+    directions = np.sign(np.asarray(deltas, dtype=float))
+    if len(directions) == 0:
+        return np.zeros(0, dtype=np.int64)
+    run_starts = np.flatnonzero(np.r_[True, directions[1:] != directions[:-1]])
+    positions = np.arange(len(directions))
+    return positions - run_starts[np.searchsorted(run_starts, positions, side='right') - 1] + 1
+
+
+def week_transitions(intervals, counts, cap=100.0):
+    """Return one row per pair of consecutive weeks with the delta, percentage change and share of total change.
+
+    'Share Change' is the delta as a percentage of all bookings, as Analytics7 labels its segments, and
+    'Run Length' counts the consecutive rises (or falls) ending at each transition.
+    """
+    intervals = np.asarray(intervals, dtype=float)
+    counts = np.asarray(counts, dtype=float)
+    deltas = np.diff(counts)
+    return pd.DataFrame({
+        'Start Interval': intervals[:-1], 'End Interval': intervals[1:],
+        'Start Bookings': counts[:-1], 'End Bookings': counts[1:],
+        'Delta': deltas,
+        'Percentage Change': percentage_change(counts, cap)[1:],
+        'Share Change': deltas / counts.sum() * 100 if len(counts) else deltas,
+        'Direction': np.sign(deltas).astype(np.int8),
+        'Run Length': run_lengths(deltas),
+        'Mid Interval': (intervals[:-1] + intervals[1:]) / 2,
+        'Mid Bookings': (counts[:-1] + counts[1:]) / 2,
+    })
+
+
+def longest_runs(transitions):
+    """Return the longest run of rises and of falls as {'up': (length, end interval), 'down': (...)}."""
+    runs = {}
+    for name, direction in (('up', 1), ('down', -1)):
+        matching = transitions[transitions['Direction'] == direction]
+        if matching.empty:
+            runs[name] = (0, None)
+        else:
+            best = matching['Run Length'].idxmax()
+            runs[name] = (int(matching.at[best, 'Run Length']), matching.at[best, 'End Interval'])
+    return runs
+
+
+def draw_transition_lines(ax, intervals, counts, up_color='green', down_color='red', **kwargs):
+    """Draw every week to week segment in one LineCollection, rises in up_color and falls or flat weeks in down_color."""
+    from matplotlib.collections import LineCollection
+
+    points = np.column_stack([np.asarray(intervals, dtype=float), np.asarray(counts, dtype=float)])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    colors = np.where(np.diff(points[:, 1]) > 0, up_color, down_color)
+    lines = LineCollection(segments, colors=list(colors), **kwargs)
+    ax.add_collection(lines)
+    ax.autoscale_view()
+    return lines
+
+
+def benchmark_transition_drawing(weeks=2000, seed=0):
+    """Time drawing weeks segments with one ax.plot call per segment against one LineCollection."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    counts = np.random.default_rng(seed).poisson(30, size=weeks)
+    intervals = np.arange(weeks)
+    timings = {}
+    for mode in ('per_segment', 'line_collection'):
+        fig, ax = plt.subplots(figsize=(16, 10))
+        started = time.perf_counter()
+        if mode == 'per_segment':
+            for i in range(1, weeks):
+                color = 'green' if counts[i] > counts[i - 1] else 'red'
+                ax.plot(intervals[i - 1:i + 1], counts[i - 1:i + 1], color=color, lw=2)
+        else:
+            draw_transition_lines(ax, intervals, counts, lw=2)
+        fig.canvas.draw()
+        timings[mode] = time.perf_counter() - started
+        plt.close(fig)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the week over week transitions of a booking csv.")
+    parser.add_argument('file_path', nargs='?', default=None)
+    parser.add_argument('--benchmark', type=int, default=None, metavar='WEEKS',
+                        help="time drawing this many weeks of segments one by one and as a LineCollection")
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        for mode, seconds in benchmark_transition_drawing(args.benchmark).items():
+            print(f"{mode:<16} {seconds * 1000:9.1f} ms for {args.benchmark} weeks")
+    if args.file_path:
+        from AnalyticsCore import interval_counts_from_calendar, read_booking_calendar
+
+        booking_counts = interval_counts_from_calendar(read_booking_calendar(args.file_path, date_column=1)[0])
+        transitions = week_transitions(booking_counts['Time Interval'], booking_counts['Number of Bookings'])
+        print(transitions.to_string(index=False, float_format='{:.2f}'.format))
+        for name, (length, end) in longest_runs(transitions).items():
+            print(f"Longest {name} run: {length} weeks" + (f", ending at interval {end:g}" if length else ""))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
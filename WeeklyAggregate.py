@@ -0,0 +1,131 @@
+"""This module saves the weekly aggregation of a booking CSV as a small versioned file that every chart script reads."""
+"""The file holds the bookings per day (the TimeBuckets calendar), the weekly table with week numbers, start dates and"""
+"""counts, and the summary stats. Every granularity the scripts draw is rebuilt from the calendar, so an event's CSV is"""
+"""parsed once and Analytics2-9 and FinalAnalytics all accept the .weekly.json file in place of the CSV."""
+
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+AGGREGATE_FORMAT = 'booking-weekly-aggregate'
+AGGREGATE_VERSION = 1
+AGGREGATE_SUFFIX = '.weekly.json'
+
+
+def is_aggregate_file(file_path):
+    """Return True when file_path names a weekly aggregate rather than a booking CSV."""
+    return str(file_path).lower().endswith(AGGREGATE_SUFFIX)
+
+
+def aggregate_path(file_path, output_directory=None):
+    """Return where the aggregate of a CSV is saved, next to it unless output_directory is given."""
+    directory = output_directory if output_directory is not None else os.path.dirname(file_path)
+    return os.path.join(directory, os.path.splitext(os.path.basename(file_path))[0] + AGGREGATE_SUFFIX)
+
+
+def source_name(file_path):
+    """Return the file name without its extension, the aggregate suffix counting as one extension."""
+    filename = os.path.basename(file_path)
+    if is_aggregate_file(filename):
+        return filename[:-len(AGGREGATE_SUFFIX)]
+    return os.path.splitext(filename)[0]
+
+
+def _date_string(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def build_aggregate(calendar, num_std=2, source=None):
+    """Return the aggregate of a TimeBuckets calendar as a json ready dictionary.
+
+    source is the CSV it was read from, its name, size and modification time are recorded so a stale
+    aggregate can be recognised.
+    """
+    from AnalyticsCore import weekly_analysis, weekly_counts_from_calendar
+
+    booking_counts_complete, stats = weekly_analysis(*weekly_counts_from_calendar(calendar), num_std=num_std)
+    first_monday_day = int(np.datetime64(stats['first_monday'], 'D').astype(np.int64))
+    aggregate = {
+        'format': AGGREGATE_FORMAT,
+        'version': AGGREGATE_VERSION,
+        'created': time.time(),
+        'calendar': {'start_date': _date_string(calendar['start_day']),
+                     'counts': [int(count) for count in calendar['counts']]},
+        'weeks': {
+            'Sequential Week Number': booking_counts_complete['Sequential Week Number'].astype(int).tolist(),
+            'Start Date': [_date_string(first_monday_day + 7 * week)
+                           for week in range(len(booking_counts_complete))],
+            'Number of Bookings': booking_counts_complete['Number of Bookings'].astype(int).tolist(),
+        },
+        'stats': {'mean': float(stats['mean']), 'std': float(stats['std']), 'threshold': float(stats['threshold']),
+                  'num_std': num_std, 'first_monday': _date_string(first_monday_day),
+                  'total_bookings': int(np.sum(calendar['counts'])), 'weeks': len(booking_counts_complete)},
+    }
+    if source is not None:
+        status = os.stat(source)
+        aggregate['source'] = {'name': os.path.basename(source), 'size': status.st_size,
+                               'mtime_ns': status.st_mtime_ns}
+    return aggregate
+
+
+def save_aggregate(aggregate, path):
+    """Write an aggregate atomically, so readers never see a half written file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as handle:
+        json.dump(aggregate, handle)
+    os.replace(temporary_path, path)
+    return path
+
+
+def load_aggregate(path):
+    """Read an aggregate, refusing files of another format or version."""
+    with open(path) as handle:
+        aggregate = json.load(handle)
+    if not isinstance(aggregate, dict) or aggregate.get('format') != AGGREGATE_FORMAT:
+        raise ValueError(f"{path} is not a weekly booking aggregate")
+    if aggregate.get('version') != AGGREGATE_VERSION:
+        raise ValueError(f"Unsupported weekly aggregate version {aggregate.get('version')} in {path}")
+    return aggregate
+
+
+def aggregate_calendar(aggregate):
+    """Return the TimeBuckets calendar stored in an aggregate."""
+    calendar = aggregate['calendar']
+    start_day = int(np.datetime64(calendar['start_date'], 'D').astype(np.int64))
+    return {'start_day': start_day, 'counts': np.asarray(calendar['counts'], dtype=np.int64)}
+
+
+def aggregate_file(file_path, output_directory=None, num_std=2, chunksize=None):
+    """Read a booking CSV once, save its aggregate and return the aggregate's path."""
+    from AnalyticsCore import read_booking_calendar
+
+    calendar, _ = read_booking_calendar(file_path, chunksize=chunksize)
+    return save_aggregate(build_aggregate(calendar, num_std=num_std, source=file_path),
+                          aggregate_path(file_path, output_directory))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Save the weekly aggregate of booking csv files for the chart scripts.")
+    parser.add_argument('file_paths', nargs='+')
+    parser.add_argument('-o', '--output-directory', default=None,
+                        help="where to save the .weekly.json files (defaults to next to each csv file)")
+    parser.add_argument('--num-std', type=float, default=2)
+    parser.add_argument('--chunksize', type=int, default=None, help="stream each csv in chunks of this many rows")
+    args = parser.parse_args(argv)
+    for file_path in args.file_paths:
+        path = aggregate_file(file_path, args.output_directory, num_std=args.num_std, chunksize=args.chunksize)
+        stats = load_aggregate(path)['stats']
+        print(f"{path}: {stats['weeks']} weeks, {stats['total_bookings']} bookings, "
+              f"threshold {stats['threshold']:.4f}, {os.path.getsize(path)} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
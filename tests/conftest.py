@@ -0,0 +1,7 @@
+"""The analysis modules are scripts in the repository root, so the tests import them from there."""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,26 @@
+"""Tests for the streaming detectors of AnomalyDetectors."""
+
+
+import math
+
+import pytest
+
+from AnomalyDetectors import DETECTORS, detect, make_detector
+
+
+@pytest.mark.parametrize('method', sorted(DETECTORS))
+def test_spike_after_flat_history_is_the_only_anomaly(method):
+    flags = detect(make_detector(method), [0] * 6 + [500])
+    assert flags['anomaly'].tolist() == [False] * 6 + [True]
+
+
+@pytest.mark.parametrize('method', ['global', 'rolling', 'ewma', 'mad'])
+def test_flat_history_scores_zero_spread_by_sign(method):
+    assert detect(make_detector(method), [3] * 6 + [3])['score'].iloc[-1] == 0
+    assert detect(make_detector(method), [3] * 6 + [1])['score'].iloc[-1] == -math.inf
+
+
+def test_mad_flags_spike_when_most_weeks_are_the_same():
+    # A few small changes leave the median absolute deviation at zero
+    flags = detect(make_detector('mad'), [5, 5, 5, 6, 5, 5, 5, 4, 5, 5, 400])
+    assert flags['anomaly'].tolist() == [False] * 10 + [True]
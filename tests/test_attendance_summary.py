@@ -0,0 +1,42 @@
+"""Tests for the attendance figures of AttendanceSummary."""
+
+
+import pandas as pd
+
+from AttendanceSummary import attendance_by_file, attendance_summary, weekly_attendance
+from CompactFrames import compact_frame
+
+COLUMNS = ['BookingReference', 'Created Date', 'Reference', 'Attendee Status', 'Attended']
+
+
+def analytics1_frame(rows):
+    # Analytics1 reads the export with header=None, so its header line is the first row
+    return pd.DataFrame([COLUMNS] + rows, columns=COLUMNS)
+
+
+def test_tied_counts_keep_the_value_counts_order():
+    df = analytics1_frame([['B1', '09/01/2023', 'Web', 'Waitlist', 'Yes'],
+                           ['B2', '02/01/2023', 'Web', 'Booked', 'No'],
+                           ['B3', '02/01/2023', 'Web', 'Booked', 'No'],
+                           ['B4', '09/01/2023', 'Web', 'Waitlist', 'Yes']])
+    expected_status, expected_attended = df['Attendee Status'].value_counts(), df['Attended'].value_counts()
+    summary = attendance_summary(compact_frame(df))
+    assert summary['status_counts'].index.tolist() == expected_status.index.tolist()
+    assert summary['attended_counts'].index.tolist() == expected_attended.index.tolist()
+
+
+def test_weekly_attendance_skips_the_header_row(capsys):
+    df = analytics1_frame([['B1', '02/01/2023', 'Web', 'Booked', 'Yes'],
+                           ['B2', '10/01/2023', 'Web', 'Booked', 'No']])
+    weekly = weekly_attendance(df)
+    assert weekly['bookings'].tolist() == [1, 1]
+    assert 'Warning' not in capsys.readouterr().out
+
+
+def test_files_with_the_same_name_stay_apart(tmp_path):
+    for folder, attended in (('x', 'Yes'), ('y', 'No')):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'a.csv').write_text(
+            f"Booking export\n{','.join(COLUMNS)}\nB1,02/01/2023,Web,Booked,{attended}\n")
+    breakdown = attendance_by_file([tmp_path / 'x' / 'a.csv', tmp_path / 'y' / 'a.csv'])
+    assert breakdown['attended'].tolist() == [1, 0]
@@ -0,0 +1,18 @@
+"""Tests for the compact booking dtypes of CompactFrames."""
+
+
+import pandas as pd
+
+from CompactFrames import compact_frame, describe_as_read
+
+
+def test_describe_as_read_matches_describe_before_compacting():
+    df = pd.DataFrame({'Created Date': ['09/01/2023', '02/01/2023', '02/01/2023', '09/01/2023'],
+                       'Attendee Status': ['Waitlist', 'Booked', 'Booked', 'Waitlist'],
+                       'Attended': ['Yes', None, 'No', 'Yes']})
+    expected = df.describe()
+    compacted = compact_frame(df.copy(), category_ratio=1)
+    assert isinstance(compacted['Created Date'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(describe_as_read(compacted), expected)
+    # The compact dtypes are kept
+    assert isinstance(compacted['Created Date'].dtype, pd.CategoricalDtype)
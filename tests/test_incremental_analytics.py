@@ -0,0 +1,49 @@
+"""Tests for the incremental weekly counts of IncrementalAnalytics."""
+
+
+import numpy as np
+
+from AnalyticsCore import analyse_booking_file
+from IncrementalAnalytics import update_weekly_counts
+
+HEADER = 'BookingReference,Created Date,Reference,Attendee Status,Attended'
+
+
+def write_bookings(path, dates, trailing_newline=True):
+    rows = [f'BR{index},{date},Web,Booked,Yes' for index, date in enumerate(dates)]
+    text = '\n'.join(['Booking export', HEADER] + rows)
+    path.write_text(text + '\n' if trailing_newline else text)
+    return path
+
+
+def assert_same_counts(incremental, exact):
+    booking_counts_complete, stats, _ = incremental
+    exact_counts, exact_stats = exact
+    assert np.array_equal(booking_counts_complete['Number of Bookings'], exact_counts['Number of Bookings'])
+    assert stats['mean'] == exact_stats['mean']
+    assert np.isclose(stats['std'], exact_stats['std'])
+
+
+def test_last_row_without_trailing_newline_is_counted(tmp_path):
+    dates = ['02/01/2023', '03/01/2023', '10/01/2023', '24/01/2023', '25/01/2023']
+    path = write_bookings(tmp_path / 'bookings.csv', dates, trailing_newline=False)
+    result = update_weekly_counts(path, state_dir=tmp_path / 'state')
+    assert result[2] == len(dates)
+    assert_same_counts(result, analyse_booking_file(path))
+
+
+def test_unterminated_row_is_counted_once_after_it_is_completed(tmp_path):
+    path = write_bookings(tmp_path / 'bookings.csv', ['02/01/2023', '10/01/2023'], trailing_newline=False)
+    state_dir = tmp_path / 'state'
+    update_weekly_counts(path, state_dir=state_dir)
+    # The writer finishes the last line and appends one more row
+    with open(path, 'a') as handle:
+        handle.write('\nBR2,31/01/2023,Web,Booked,Yes\n')
+    assert_same_counts(update_weekly_counts(path, state_dir=state_dir), analyse_booking_file(path))
+
+
+def test_same_count_every_week_gives_zero_z_scores(tmp_path):
+    path = write_bookings(tmp_path / 'bookings.csv', ['02/01/2023', '09/01/2023', '16/01/2023'])
+    booking_counts_complete, stats, _ = update_weekly_counts(path, state_dir=tmp_path / 'state')
+    assert stats['std'] == 0
+    assert (booking_counts_complete['z-score'] == 0).all()